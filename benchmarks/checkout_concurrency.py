@@ -0,0 +1,78 @@
+"""Fire parallel checkouts at one SKU and verify that stock is never oversold.
+
+Creates its own user, product and carts in the database configured by DATABASE_URL,
+so point it at a scratch database. Run from the project root:
+
+    python -m benchmarks.checkout_concurrency [carts] [stock] [quantity]
+"""
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import select, func
+
+import crud
+from database import AsyncSessionLocal, engine, Base
+from models import User, Product, Cart, CartItem
+from utils.enums import CartStatus
+
+
+async def seed(carts: int, stock: int, quantity: int):
+    tag = uuid.uuid4().hex[:8]
+    async with AsyncSessionLocal() as db:
+        user = User(username=f"checkout-{tag}", email=f"checkout-{tag}@example.com", password="-", is_admin=False)
+        product = Product(name=f"checkout-sku-{tag}", price=9.99, stock=stock)
+        db.add_all([user, product])
+        await db.flush()
+        cart_ids = []
+        for _ in range(carts):
+            cart = Cart(user_id=user.id, status=CartStatus.OPEN, created_at=datetime.now(), total_price=0)
+            db.add(cart)
+            await db.flush()
+            db.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=quantity))
+            cart_ids.append(cart.id)
+        await db.commit()
+        return product.id, cart_ids
+
+
+async def checkout(cart_id: int):
+    async with AsyncSessionLocal() as db:
+        try:
+            await crud.checkout_cart(db, cart_id)
+            return True
+        except HTTPException as e:
+            if e.status_code != 409:
+                raise
+            return False
+
+
+async def main(carts: int, stock: int, quantity: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    product_id, cart_ids = await seed(carts, stock, quantity)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(checkout(cart_id) for cart_id in cart_ids))
+    elapsed = time.perf_counter() - start
+
+    async with AsyncSessionLocal() as db:
+        product = await crud.get_product_by_id(db, product_id)
+        checked_out = await db.scalar(select(func.count()).where(Cart.id.in_(cart_ids),
+                                                                 Cart.status == CartStatus.CHECKED_OUT))
+    succeeded = sum(results)
+    expected_successes = min(carts, stock // quantity)
+    print(f"{carts} parallel checkouts of {quantity} unit(s) against stock {stock} in {elapsed:.3f}s")
+    print(f"succeeded: {succeeded}, rejected: {carts - succeeded}, remaining stock: {product.stock}")
+    await engine.dispose()
+    assert product.stock >= 0, "stock went negative"
+    assert succeeded == checked_out == expected_successes, "checkout results do not match cart states"
+    assert product.stock == stock - succeeded * quantity, "stock does not match successful checkouts"
+    print("OK: no oversell")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    asyncio.run(main(*(args + [50, 20, 1][len(args):])))
@@ -0,0 +1,36 @@
+"""Compare cold (signature verified) and warm (verified-token cache hit) JWT decode cost.
+
+Run from the project root: python -m benchmarks.jwt_decode [iterations]
+"""
+import os
+import sys
+import timeit
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from utils.cache import token_cache
+from utils.jwt import create_access_token, decode_access_token
+
+
+def main(iterations: int):
+    token = create_access_token({"sub": "benchmark-user"})
+
+    def cold():
+        token_cache.clear()
+        decode_access_token(token)
+
+    def warm():
+        decode_access_token(token)
+
+    decode_access_token(token)
+    cold_us = min(timeit.repeat(cold, number=iterations, repeat=5)) / iterations * 1e6
+    warm_us = min(timeit.repeat(warm, number=iterations, repeat=5)) / iterations * 1e6
+    print(f"algorithm: {os.environ['ALGORITHM']}")
+    print(f"cold decode: {cold_us:8.2f} us/op")
+    print(f"warm decode: {warm_us:8.2f} us/op")
+    print(f"speedup:     {cold_us / warm_us:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
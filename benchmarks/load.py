@@ -0,0 +1,255 @@
+"""Drive the app in-process and report latency, throughput and queries per request for each route.
+
+Requests go through an ASGI transport, so no server or network is involved; the database is the one
+configured by DATABASE_URL, seeded beforehand with ``python -m benchmarks.seed``. Run from the project root:
+
+    python -m benchmarks.load [--concurrency 16] [--requests 500] [--writes] [--route products]
+                              [--out results.json] [--baseline benchmarks/baseline.json] [--save-baseline PATH]
+
+Results are diffed against ``--baseline`` when given; ``--fail-on-regression`` exits non-zero when a route's
+p95 grows by more than ``--threshold`` percent or it issues more queries per request than before.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("CART_JOBS_ENABLED", "false")
+os.environ.setdefault("METRICS_ENABLED", "true")
+
+import httpx
+from sqlalchemy import select
+
+import crud
+from database import AsyncSessionLocal
+from main import app
+from models import User, Product, Cart, CartItem
+from schemas import CartCreate
+from utils import metrics
+from utils.enums import CartStatus
+from utils.jwt import create_access_token
+
+
+class Context:
+    """Ids sampled from the seeded database, plus a token per benchmark user."""
+
+    async def load(self, sample: int):
+        async with AsyncSessionLocal() as db:
+            users = (await db.execute(select(User.id, User.username).where(User.username.like("bench_%"))
+                                      .order_by(User.id).limit(sample))).all()
+            if not users:
+                sys.exit("No benchmark users found; run python -m benchmarks.seed first.")
+            self.users = [(user.id, {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"})
+                          for user in users]
+            user_ids = [user.id for user in users]
+            self.product_ids = list((await db.scalars(select(Product.id))).all())
+            self.stocked_ids = list((await db.scalars(select(Product.id).where(Product.stock >= 1000)
+                                                      .limit(1000))).all())
+            self.cart_ids = list((await db.scalars(select(Cart.id).where(Cart.user_id.in_(user_ids)))).all())
+            self.item_ids = list((await db.scalars(select(CartItem.id).join(Cart)
+                                                   .where(Cart.user_id.in_(user_ids)).limit(sample * 4))).all())
+            self.open_carts = dict((await db.execute(select(Cart.user_id, Cart.id).where(
+                Cart.user_id.in_(user_ids), Cart.status == CartStatus.OPEN))).all())
+        self.next_user = itertools.count()
+
+    def user(self, rng: random.Random):
+        return rng.choice(self.users)
+
+
+async def ensure_open_cart(ctx: Context, user_id: int, rng: random.Random):
+    async with AsyncSessionLocal() as db:
+        cart_id = await crud.get_user_open_cart_id(db, user_id)
+        if cart_id is None:
+            cart_id = (await crud.create_cart(db, CartCreate(user_id=user_id, total_price=0))).id
+            lines = {product_id: 1 for product_id in rng.sample(ctx.stocked_ids, rng.randint(1, 4))}
+            await crud.upsert_cart_items(db, cart_id, lines)
+    ctx.open_carts[user_id] = cart_id
+
+
+class Scenario:
+    def __init__(self, name: str, route: str, build, prepare=None, write: bool = False):
+        self.name = name
+        self.route = route
+        self.build = build
+        self.prepare = prepare
+        self.write = write
+
+
+def get(path, params=None, auth=False):
+    def build(ctx, rng):
+        user_id, headers = ctx.user(rng)
+        return "GET", path(ctx, rng, user_id) if callable(path) else path, {
+            "params": params(ctx, rng) if callable(params) else params, "headers": headers if auth else None}
+    return build
+
+
+def search_term(ctx, rng):
+    return {"q": rng.choice(["wireless", "headphones", "lamp", "keybo", "chargr", "smart watch", "premium"]),
+            "limit": 20}
+
+
+async def prepare_checkout(ctx, rng):
+    user_id, headers = ctx.users[next(ctx.next_user) % len(ctx.users)]
+    await ensure_open_cart(ctx, user_id, rng)
+    return "PUT", "/carts/cart/checkout", {"headers": headers}
+
+
+async def prepare_add_items(ctx, rng):
+    user_id, headers = ctx.users[next(ctx.next_user) % len(ctx.users)]
+    await ensure_open_cart(ctx, user_id, rng)
+    lines = [{"product_id": product_id, "quantity": 1} for product_id in rng.sample(ctx.stocked_ids, 3)]
+    return "POST", "/cart_items/batch", {"headers": headers,
+                                         "json": {"cart_id": ctx.open_carts[user_id], "items": lines}}
+
+
+SCENARIOS = [
+    Scenario("GET /users/me", "/users/me", get("/users/me", auth=True)),
+    Scenario("GET /users/{user_id}", "/users/{user_id}", get(lambda ctx, rng, user_id: f"/users/{user_id}")),
+    Scenario("GET /addresses/", "/addresses/", get("/addresses/", auth=True)),
+    Scenario("GET /products/", "/products/", get("/products/")),
+    Scenario("GET /products/ filtered", "/products/",
+             get("/products/", lambda ctx, rng: {"price__lt": rng.randint(20, 200), "stock__gt": 0, "sort": "-price"})),
+    Scenario("GET /products/{product_id}", "/products/{product_id}",
+             get(lambda ctx, rng, user_id: f"/products/{rng.choice(ctx.product_ids)}")),
+    Scenario("GET /products/batch", "/products/batch",
+             get("/products/batch", lambda ctx, rng: {"ids": ",".join(map(str, rng.sample(ctx.product_ids, 20)))})),
+    Scenario("GET /products/search", "/products/search", get("/products/search", search_term)),
+    Scenario("GET /carts/cart/{cart_id}", "/carts/cart/{cart_id}",
+             get(lambda ctx, rng, user_id: f"/carts/cart/{rng.choice(ctx.cart_ids)}")),
+    Scenario("GET /carts/user/{user_id}/all", "/carts/user/{user_id}/all",
+             get(lambda ctx, rng, user_id: f"/carts/user/{user_id}/all")),
+    Scenario("GET /carts/user/{user_id}/all summary", "/carts/user/{user_id}/all",
+             get(lambda ctx, rng, user_id: f"/carts/user/{user_id}/all", {"view": "summary"})),
+    Scenario("GET /carts/user/open_cart", "/carts/user/open_cart", get("/carts/user/open_cart", auth=True)),
+    Scenario("GET /cart_items/{cart_item_id}", "/cart_items/{cart_item_id}",
+             get(lambda ctx, rng, user_id: f"/cart_items/{rng.choice(ctx.item_ids)}")),
+    Scenario("GET /orders/me", "/orders/me", get("/orders/me", auth=True)),
+    Scenario("POST /cart_items/batch", "/cart_items/batch", None, prepare_add_items, write=True),
+    Scenario("PUT /carts/cart/checkout", "/carts/cart/checkout", None, prepare_checkout, write=True),
+]
+
+
+def query_totals(route: str):
+    series = metrics.db_queries._values.get((route,))
+    return (series[-2], series[-1]) if series else (0.0, 0)
+
+
+def percentile(samples: list, q: int) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1] if len(samples) > 1 else samples[0]
+
+
+async def run_scenario(client, ctx: Context, scenario: Scenario, requests: int, concurrency: int, warmup: int,
+                       rng: random.Random) -> dict:
+    latencies, errors = [], {}
+
+    async def request(measure: bool):
+        if scenario.prepare is not None:
+            method, url, kwargs = await scenario.prepare(ctx, rng)
+        else:
+            method, url, kwargs = scenario.build(ctx, rng)
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        if measure:
+            latencies.append(elapsed * 1000)
+            if response.status_code >= 400:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+    for _ in range(warmup):
+        await request(False)
+    remaining = itertools.count()
+
+    async def worker():
+        while next(remaining) < requests:
+            await request(True)
+
+    queries_before = query_totals(scenario.route)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    queries_after = query_totals(scenario.route)
+    counted = queries_after[1] - queries_before[1]
+    return {
+        "route": scenario.route,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        # Taken from the metrics middleware; prepare steps run outside the app and are not counted.
+        "queries_per_request": round((queries_after[0] - queries_before[0]) / counted, 2) if counted else None,
+        "errors": errors,
+    }
+
+
+def diff(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    print(f"\n{'route':42} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>9} {'queries':>9}")
+    for name, current in results["routes"].items():
+        previous = baseline["routes"].get(name)
+        if previous is None:
+            print(f"{name:42} {'(new)':>9}")
+            continue
+        changes = [(current[key] - previous[key]) / previous[key] * 100 if previous[key] else 0.0
+                   for key in ("p50_ms", "p95_ms", "p99_ms", "rps")]
+        queries = (current["queries_per_request"] or 0) - (previous["queries_per_request"] or 0)
+        print(f"{name:42} " + " ".join(f"{change:+8.1f}%" for change in changes) + f" {queries:+9.2f}")
+        if changes[1] > threshold or queries > 0:
+            regressions.append(name)
+    return regressions
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    scenarios = [scenario for scenario in SCENARIOS
+                 if (args.writes or not scenario.write) and (not args.route or args.route in scenario.name)]
+    async with app.router.lifespan_context(app):
+        ctx = Context()
+        await ctx.load(args.users)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            results = {"meta": {"concurrency": args.concurrency, "requests": args.requests,
+                                "products": len(ctx.product_ids), "users": len(ctx.users),
+                                "python": platform.python_version(), "machine": platform.machine()},
+                       "routes": {}}
+            print(f"{'route':42} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>9} errors")
+            for scenario in scenarios:
+                result = await run_scenario(client, ctx, scenario, args.requests, args.concurrency, args.warmup, rng)
+                results["routes"][scenario.name] = result
+                print(f"{scenario.name:42} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['p99_ms']:9.2f} "
+                      f"{result['rps']:9.1f} {result['queries_per_request'] or 0:9.2f} {result['errors'] or ''}")
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = diff(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nregressed: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per route")
+    parser.add_argument("--users", type=int, default=500, help="benchmark users to spread requests over")
+    parser.add_argument("--writes", action="store_true", help="also run routes that modify data")
+    parser.add_argument("--route", help="only run routes whose name contains this text")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="diff against a results JSON")
+    parser.add_argument("--save-baseline", help="write results to this baseline path")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 growth in percent")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    asyncio.run(main(parser.parse_args()))
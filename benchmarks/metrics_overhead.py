@@ -0,0 +1,80 @@
+"""Measure what the metrics middleware and SQL cursor hooks add to a request.
+
+Drives a minimal FastAPI app directly through ASGI, once bare and once wrapped in MetricsMiddleware,
+so the difference is the instrumentation cost rather than network or database noise.
+
+Run from the project root: python -m benchmarks.metrics_overhead [requests]
+"""
+import asyncio
+import sys
+import time
+import timeit
+
+from fastapi import FastAPI
+
+from utils import metrics
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    if instrumented:
+        app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+async def drive(app, requests: int) -> float:
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": "/items/1", "raw_path": b"/items/1", "root_path": "", "query_string": b"", "headers": [],
+             "client": ("127.0.0.1", 1234), "server": ("test", 80)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(200):
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def cursor_hooks_us(iterations: int) -> float:
+    info = {}
+
+    class Connection:
+        pass
+
+    conn = Connection()
+    conn.info = info
+
+    def execute():
+        metrics.before_cursor_execute(conn, None, "SELECT 1", None, None, False)
+        metrics.after_cursor_execute(conn, None, "SELECT 1", None, None, False)
+
+    token = metrics.request_stats.set(metrics.RequestStats())
+    try:
+        return min(timeit.repeat(execute, number=iterations, repeat=5)) / iterations * 1e6
+    finally:
+        metrics.request_stats.reset(token)
+
+
+async def main(requests: int):
+    bare, instrumented = make_app(False), make_app(True)
+    bare_us = min([await drive(bare, requests) for _ in range(3)])
+    instrumented_us = min([await drive(instrumented, requests) for _ in range(3)])
+    print(f"bare request:         {bare_us:8.2f} us")
+    print(f"instrumented request: {instrumented_us:8.2f} us")
+    print(f"middleware overhead:  {instrumented_us - bare_us:8.2f} us ({(instrumented_us / bare_us - 1) * 100:.1f}%)")
+    print(f"cursor hooks:         {cursor_hooks_us(requests):8.2f} us per SQL statement")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
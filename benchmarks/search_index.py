@@ -0,0 +1,68 @@
+"""Build the product search index over a synthetic catalog and measure memory and query latency.
+
+Run from the project root: python -m benchmarks.search_index [products]
+"""
+import itertools
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from utils.search import SearchIndex
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "zo", "pe", "qua", "dor", "lin", "mar", "tex"]
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def main(products: int):
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(50000, rng)
+    # Skew word choice so a few words are very common, like real catalog text.
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    tracemalloc.start()
+    index = SearchIndex()
+    started = time.perf_counter()
+    for product_id in range(1, products + 1):
+        name = " ".join(rng.choices(vocabulary, cum_weights=weights, k=3))
+        description = " ".join(rng.choices(vocabulary, cum_weights=weights, k=20))
+        index.add(product_id, name, description, rng.uniform(1, 500), rng.randint(0, 20))
+    build_seconds = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    common, rare = vocabulary[0], vocabulary[len(vocabulary) // 2]
+    typo = rare[:1] + rare[2:]
+    queries = {
+        "common term": (common, {}),
+        "rare term": (rare, {}),
+        "prefix": (rare[:4], {}),
+        "typo": (typo, {}),
+        "two terms": (f"{common} {rare}", {}),
+        "filtered": (common, {"min_price": 100, "max_price": 200, "in_stock": True}),
+    }
+    stats = index.stats()
+    print(f"products:      {products}")
+    print(f"build:         {build_seconds:8.2f} s")
+    print(f"memory:        {current / 2**20:8.1f} MiB (peak {peak / 2**20:.1f} MiB)")
+    print(f"tokens:        {stats['tokens']}, postings: {stats['postings']}")
+    for label, (query, filters) in queries.items():
+        timings = []
+        for _ in range(20):
+            started = time.perf_counter()
+            total, _ = index.search(query, 50, **filters)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f"{label:14} p50 {statistics.median(timings):8.2f} ms  p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms"
+              f"  matches {total}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
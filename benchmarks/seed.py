@@ -0,0 +1,134 @@
+"""Seed a synthetic catalog, users, addresses, carts and orders for the load benchmarks.
+
+Writes to the database configured by DATABASE_URL, so point it at a scratch database. Run from the
+project root:
+
+    python -m benchmarks.seed [--products 100000] [--users 1000] [--carts-per-user 4] [--reset]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from passlib.context import CryptContext
+from sqlalchemy import insert, select, func
+
+from database import AsyncSessionLocal, engine, Base
+from models import User, Product, Cart, CartItem, Address, Order
+from utils.enums import CartStatus
+
+PASSWORD = "benchmark-password"
+ADJECTIVES = ["red", "blue", "wireless", "compact", "premium", "classic", "smart", "portable", "ergonomic", "solar",
+              "vintage", "silent", "rugged", "slim", "gaming", "organic", "steel", "bamboo", "digital", "magnetic"]
+NOUNS = ["headphones", "keyboard", "mouse", "lamp", "backpack", "bottle", "charger", "speaker", "camera", "watch",
+         "kettle", "chair", "desk", "monitor", "router", "blender", "jacket", "sneakers", "tripod", "drone"]
+WORDS = ADJECTIVES + NOUNS + ["with", "for", "and", "battery", "cable", "case", "light", "pro", "mini", "max",
+                              "travel", "home", "office", "outdoor", "kitchen", "kids", "warranty", "edition"]
+COUNTRIES = {"DE": ["Berlin", "Hamburg", "Munich"], "FR": ["Paris", "Lyon"], "IR": ["Tehran", "Shiraz", "Tabriz"],
+             "US": ["Boston", "Denver", "Austin"]}
+CHUNK = 5000
+
+
+def item_count(rng: random.Random) -> int:
+    # Geometric: most carts hold a few lines, a long tail holds many.
+    count = 1
+    while count < 15 and rng.random() < 0.7:
+        count += 1
+    return count
+
+
+async def insert_chunks(db, model, rows: list):
+    for start in range(0, len(rows), CHUNK):
+        await db.execute(insert(model), rows[start:start + CHUNK])
+
+
+async def seed(products: int, users: int, carts_per_user: int, reset: bool, seed_value: int):
+    rng = random.Random(seed_value)
+    async with engine.begin() as conn:
+        if reset:
+            await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        first_product = (await db.scalar(select(func.max(Product.id)))) or 0
+        await insert_chunks(db, Product, [{
+            "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {first_product + i}",
+            "price": round(rng.uniform(1, 500), 2),
+            "stock": rng.choice([0, 1, 5, 20, 100, 1000]),
+            "description": " ".join(rng.choices(WORDS, k=rng.randint(8, 30))),
+        } for i in range(1, products + 1)])
+        products_by_id = {row.id: row for row in await db.execute(
+            select(Product.id, Product.name, Product.price, Product.stock))}
+        product_ids = list(products_by_id)
+        # Open carts only hold products with stock to spare, so benchmarked checkouts go through.
+        stocked_ids = [row.id for row in products_by_id.values() if row.stock >= 100]
+
+        # Hash once: bcrypt per user would dominate seeding time.
+        password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(PASSWORD)
+        tag = f"{int(time.time())}{rng.randrange(1000)}"
+        await insert_chunks(db, User, [{
+            "username": f"bench_{tag}_{i}", "email": f"bench_{tag}_{i}@example.com", "password": password,
+            "first_name": "Bench", "last_name": str(i), "is_admin": i == 0,
+        } for i in range(users)])
+        user_ids = list((await db.scalars(select(User.id).where(User.username.like(f"bench_{tag}_%")))).all())
+
+        await insert_chunks(db, Address, [{
+            "user_id": user_id, "country": country, "city": rng.choice(COUNTRIES[country]), "address": f"Street {n}",
+        } for user_id in user_ids for n in range(rng.randint(1, 3)) for country in [rng.choice(list(COUNTRIES))]])
+
+        now = datetime.now()
+        carts, cart_lines = [], []
+        for user_id in user_ids:
+            for n in range(carts_per_user):
+                created_at = now - timedelta(days=rng.uniform(0, 90))
+                status = CartStatus.OPEN if n == carts_per_user - 1 else rng.choice(
+                    [CartStatus.CHECKED_OUT, CartStatus.CHECKED_OUT, CartStatus.CANCELLED])
+                candidates = stocked_ids if status == CartStatus.OPEN else product_ids
+                lines = {product_id: rng.randint(1, 3) for product_id in rng.sample(candidates, item_count(rng))}
+                carts.append({"user_id": user_id, "created_at": created_at, "last_modified": created_at,
+                              "status": status, "total_price": sum(products_by_id[product_id].price * quantity
+                                                                   for product_id, quantity in lines.items())})
+                cart_lines.append(lines)
+        cart_ids = []
+        for start in range(0, len(carts), CHUNK):
+            result = await db.execute(insert(Cart).returning(Cart.id, sort_by_parameter_order=True),
+                                      carts[start:start + CHUNK])
+            cart_ids.extend(result.scalars().all())
+
+        items, orders = [], []
+        for cart_id, cart, lines in zip(cart_ids, carts, cart_lines):
+            items.extend({"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
+                         for product_id, quantity in lines.items())
+            if cart["status"] == CartStatus.CHECKED_OUT:
+                orders.append({"user_id": cart["user_id"], "cart_id": cart_id, "total_price": cart["total_price"],
+                               "item_count": sum(lines.values()), "created_at": cart["created_at"], "lines": [
+                                   {"product_id": product_id, "name": products_by_id[product_id].name,
+                                    "quantity": quantity, "price": products_by_id[product_id].price}
+                                   for product_id, quantity in sorted(lines.items())]})
+        await insert_chunks(db, CartItem, items)
+        await insert_chunks(db, Order, orders)
+        await db.commit()
+    await engine.dispose()
+    print(f"seeded {products} products, {len(user_ids)} users, {len(carts)} carts, {len(items)} cart items, "
+          f"{len(orders)} orders in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--carts-per-user", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args()
+    asyncio.run(seed(args.products, args.users, args.carts_per_user, args.reset, args.seed))
+
+
+if __name__ == "__main__":
+    main()
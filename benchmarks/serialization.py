@@ -0,0 +1,92 @@
+"""Compare response serialization paths per route, on transient ORM objects shaped like each route's output.
+
+  fastapi:  FastAPI's own path (validate, dump_python, json.dumps in JSONResponse), what every route used before
+  fast:     the same path rendered by FastJSONResponse, what routes returning plain objects get now
+  adapter:  ModelResponse, one cached TypeAdapter validating and dumping straight to bytes
+
+Run from the project root: python -m benchmarks.serialization [iterations]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from models import Product, Cart, CartItem, Order, User
+from schemas import ProductOut, ProductPage, CartPage, OrderPage, UserOut
+from utils.enums import CartStatus
+from utils.responses import FastJSONResponse, ModelResponse
+
+NOW = datetime(2025, 1, 1, 12, 0)
+
+
+def product(i: int) -> Product:
+    return Product(id=i, name=f"wireless headphones {i}", price=49.99 + i, stock=i % 100, image_url=None,
+                   description="Over-ear wireless headphones with a long battery life and a travel case.")
+
+
+def cart(i: int) -> Cart:
+    items = [CartItem(id=i * 10 + n, cart_id=i, product_id=n + 1, quantity=n % 3 + 1) for n in range(5)]
+    return Cart(id=i, user_id=1, status=CartStatus.CHECKED_OUT, total_price=123.45, created_at=NOW, items=items)
+
+
+def order(i: int) -> Order:
+    lines = [{"product_id": n + 1, "name": f"product {n + 1}", "quantity": 1, "price": 9.99} for n in range(5)]
+    return Order(id=i, user_id=1, cart_id=i, total_price=49.95, item_count=5, lines=lines, created_at=NOW)
+
+
+def page(items: list) -> dict:
+    return {"items": items, "next_cursor": "eyJzIjoiaWQiLCJ2IjpbNTBdfQ", "total": None}
+
+
+CASES = [
+    ("GET /users/{user_id}", UserOut, User(id=1, username="jane", first_name="Jane", last_name="Doe",
+                                           email="jane@example.com", is_admin=False, created_at=NOW)),
+    ("GET /products/{product_id}", ProductOut, product(1)),
+    ("GET /products/ limit=50", ProductPage, page([product(i) for i in range(50)])),
+    ("GET /products/ limit=500", ProductPage, page([product(i) for i in range(500)])),
+    ("GET /products/batch ids=100", List[Optional[ProductOut]], [product(i) for i in range(100)]),
+    ("GET /carts/user/{user_id}/all limit=50", CartPage, page([cart(i) for i in range(50)])),
+    ("GET /orders/me limit=20", OrderPage, page([order(i) for i in range(20)])),
+]
+
+
+async def fastapi_path(field, content, response_class):
+    return response_class(await serialize_response(field=field, response_content=content)).body
+
+
+async def measure(render, iterations: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await render()
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+async def main(iterations: int):
+    print(f"{'route':40} {'fastapi us':>11} {'fast us':>9} {'adapter us':>11} {'speedup':>8}")
+    for name, model, content in CASES:
+        field = create_model_field(name="Response", type_=model, mode="serialization")
+        default = await fastapi_path(field, content, JSONResponse)
+        assert ModelResponse(content, model).body == await fastapi_path(field, content, FastJSONResponse)
+        assert default.replace(b" ", b"") == ModelResponse(content, model).body.replace(b" ", b"")
+        # Large pages get fewer iterations so every row takes about as long.
+        count = max(iterations // max(len(content["items"]) if isinstance(content, dict) else 1, 1), 20)
+
+        async def adapter():
+            return ModelResponse(content, model).body
+
+        fastapi_us = await measure(lambda: fastapi_path(field, content, JSONResponse), count)
+        fast_us = await measure(lambda: fastapi_path(field, content, FastJSONResponse), count)
+        adapter_us = await measure(adapter, count)
+        print(f"{name:40} {fastapi_us:11.1f} {fast_us:9.1f} {adapter_us:11.1f} {fastapi_us / adapter_us:7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
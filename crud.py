@@ -1,21 +1,31 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, join
+from sqlalchemy import select, join, tuple_, update, delete, values, column, func, Integer, and_, any_, literal
+from sqlalchemy.dialects.postgresql import insert, ARRAY
 from sqlalchemy.orm import selectinload
 from sqlalchemy.orm import aliased
-from models import User, Product, Cart, CartItem, Address
+from sqlalchemy.orm.attributes import set_committed_value
+from models import User, Product, Cart, CartItem, Address, ArchivedCart, ArchivedCartItem, Order, CatalogPruned, \
+    CatalogChange, catalog_version
 from schemas import UserCreate, UserUpdate, ProductCreate, ProductUpdate, CartCreate, CartUpdate, CartItemCreate, \
-    CartItemUpdate, AddressCreate, AddressUpdate
+    CartItemUpdate, AddressCreate, AddressUpdate, ProductOut
 from fastapi import HTTPException
 import utils.security as security
-from typing import List, Type, Any
-from sqlalchemy.sql import Select
-from sqlalchemy.orm import DeclarativeMeta
+from typing import List
 from utils.enums import CartStatus
+from utils.cache import product_cache, principal_cache
+from utils.search import SearchIndex, search_index
+from utils.catalog import CatalogSnapshot, catalog, CATALOG_SETTLE_SECONDS
+from utils.query import ListQuery
+from utils.loader import BatchLoader
 
 
-async def get_user_by_username(db: AsyncSession, username: str):
-    result = await db.execute(select(User).options(selectinload(User.addresses)).where(User.username == username))
+async def get_user_by_username(db: AsyncSession, username: str, with_addresses: bool = True):
+    stmt = select(User).where(User.username == username)
+    if with_addresses:
+        stmt = stmt.options(selectinload(User.addresses))
+    result = await db.execute(stmt)
     return result.scalars().first()
 
 
@@ -29,9 +39,14 @@ async def get_user_by_id(db: AsyncSession, user_id: int):
     return result.scalars().first()
 
 
+async def user_exists(db: AsyncSession, user_id: int) -> bool:
+    result = await db.execute(select(User.id).where(User.id == user_id))
+    return result.scalar() is not None
+
+
 async def create_user(db: AsyncSession, user: UserCreate):
     try:
-        hashed_password = security.hash_password(user.password)
+        hashed_password = await security.hash_password(user.password)
         db_user = User(username=user.username, email=user.email, password=hashed_password, first_name=user.first_name,
                        last_name=user.last_name, is_admin=user.is_admin)
         db.add(db_user)
@@ -48,9 +63,10 @@ async def update_user(db: AsyncSession, user_update: UserUpdate, user_id: int):
         user = await get_user_by_id(db, user_id)
         if user is None:
             return False
+        principal_cache.delete(user.username)
         update_data = user_update.model_dump(exclude_unset=True)
         if "password" in update_data:
-            hashed_password = security.hash_password(update_data["password"])
+            hashed_password = await security.hash_password(update_data["password"])
             update_data["password"] = hashed_password
         for key, value in update_data.items():
             setattr(user, key, value)
@@ -59,6 +75,7 @@ async def update_user(db: AsyncSession, user_update: UserUpdate, user_id: int):
 
         await db.commit()
         await db.refresh(user)
+        principal_cache.delete(user.username)
         return True
     except Exception as e:
         await db.rollback()
@@ -69,19 +86,161 @@ async def delete_user(db: AsyncSession, user):
     try:
         await db.delete(user)
         await db.commit()
+        principal_cache.delete(user.username)
         return True
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to delete the user. ERROR:" + str(e))
 
 
+def invalidate_cached_products(*products):
+    for product in products:
+        product_cache.delete(("id", product.id))
+        product_cache.delete(("name", product.name))
+
+
+def index_product(product):
+    search_index.add(product.id, product.name, product.description, product.price, product.stock)
+
+
+def index_rows(index: SearchIndex, rows):
+    for row in rows:
+        index.add(row.id, row.name, row.description, row.price, row.stock)
+
+
+async def rebuild_search_index(db: AsyncSession, batch_size: int = 1000):
+    # Build into a fresh index and swap it in, so searches keep hitting the old one meanwhile.
+    index = SearchIndex(search_index.max_description_tokens, search_index.min_typo_length,
+                        search_index.max_candidates)
+    search_index.start_journal()
+    try:
+        async for rows in stream_products(db, batch_size):
+            # Tokenizing is CPU-bound; the new index is private until the swap, so a worker thread can fill it.
+            await asyncio.to_thread(index_rows, index, rows)
+    except BaseException:
+        search_index.drop_journal()
+        raise
+    search_index.replace_with(index)
+    return len(index)
+
+
+def log_catalog_change(product_ids):
+    """A CTE taking a catalog version and logging ``product_ids`` under it, returning the version.
+
+    Run it last, right before the commit, so a version is in flight only for as long as the commit takes.
+    """
+    version = select(catalog_version.next_value().label("version")).cte("version")
+    stmt = insert(CatalogChange).from_select(
+        ["version", "product_id"],
+        select(version.c.version, func.unnest(literal(list(product_ids), ARRAY(Integer)))),
+    )
+    return stmt.returning(CatalogChange.version).cte("logged")
+
+
+async def bump_catalog_version(db: AsyncSession, product_ids) -> int:
+    logged = log_catalog_change(product_ids)
+    return await db.scalar(select(logged.c.version).limit(1))
+
+
+async def get_catalog_changes(db: AsyncSession, after: int):
+    """The last version after ``after`` with no earlier one missing, and the products changed up to it.
+
+    Versions come from a sequence, so they can commit out of order, and a rolled back write leaves a hole for
+    good. A missing version is waited for until some later version is CATALOG_SETTLE_SECONDS old: it was
+    handed out before that one, just before its commit, so by then it has either committed or never will.
+    """
+    settled = select(func.max(CatalogChange.version)).where(
+        CatalogChange.created_at <= func.clock_timestamp() - timedelta(seconds=CATALOG_SETTLE_SECONDS))
+    result = await db.execute(select(CatalogChange.version, CatalogChange.product_id,
+                                     settled.scalar_subquery().label("settled"))
+                              .where(CatalogChange.version > after).order_by(CatalogChange.version))
+    version, product_ids = after, set()
+    for change in result:
+        if change.version > version + 1 and change.version > (change.settled or 0):
+            break
+        version = change.version
+        product_ids.add(change.product_id)
+    return version, product_ids
+
+
+async def get_catalog_pruned(db: AsyncSession) -> int:
+    result = await db.execute(select(CatalogPruned.version).where(CatalogPruned.id == 1))
+    return result.scalar() or 0
+
+
+async def get_catalog_version(db: AsyncSession) -> int:
+    version, _ = await get_catalog_changes(db, await get_catalog_pruned(db))
+    return version
+
+
+async def rebuild_catalog(db: AsyncSession, batch_size: int = 1000):
+    # Read the version first: rows streamed afterwards are at least that new, and the next sync replays the rest.
+    version = await get_catalog_version(db)
+    entries = {}
+    async for rows in stream_products(db, batch_size):
+        for row in rows:
+            entries[row.id] = CatalogSnapshot.encode(ProductOut.model_validate(row))
+    catalog.load(entries, version)
+    return len(entries)
+
+
+async def sync_catalog(db: AsyncSession):
+    """Apply the product changes other workers committed since this worker's catalog version."""
+    version, product_ids = await get_catalog_changes(db, catalog.version)
+    # Checked after reading the changes, so a prune committed in between is still noticed.
+    if catalog.version < await get_catalog_pruned(db):
+        # The changes this worker missed were already pruned.
+        if catalog.loaded:
+            return await rebuild_catalog(db)
+        catalog.version = await get_catalog_version(db)
+        return 0
+    if version == catalog.version:
+        return 0
+    result = await db.execute(select(Product).where(Product.id == any_(literal(list(product_ids), ARRAY(Integer)))))
+    products = [ProductOut.model_validate(product) for product in result.scalars()]
+    removed = product_ids - {product.id for product in products}
+    catalog.patch(products, removed)
+    catalog.version = version
+    for product in products:
+        product_cache.set(("id", product.id), product)
+        index_product(product)
+    for product_id in removed:
+        product_cache.delete(("id", product_id))
+        search_index.remove(product_id)
+    return len(product_ids)
+
+
+async def prune_catalog_changes(db: AsyncSession, keep_versions: int):
+    try:
+        pruned = await db.scalar(select(func.max(CatalogChange.version))) or 0
+        pruned -= keep_versions
+        if pruned <= await get_catalog_pruned(db):
+            return 0
+        # Committed with the delete, so a worker never sees the changes gone without the floor that explains it.
+        stmt = insert(CatalogPruned).values(id=1, version=pruned)
+        await db.execute(stmt.on_conflict_do_update(index_elements=[CatalogPruned.id],
+                                                    set_={"version": func.greatest(CatalogPruned.version, pruned)}))
+        result = await db.execute(delete(CatalogChange).where(CatalogChange.version <= pruned)
+                                  .execution_options(synchronize_session=False))
+        await db.commit()
+        return result.rowcount
+    except Exception:
+        await db.rollback()
+        raise
+
+
 async def create_product(db: AsyncSession, product: ProductCreate):
     try:
         db_product = Product(name=product.name, price=product.price, description=product.description,
                              stock=product.stock, image_url=product.image_url)
         db.add(db_product)
+        await db.flush()
+        version = await bump_catalog_version(db, [db_product.id])
         await db.commit()
         await db.refresh(db_product)
+        product_cache.delete(("name", db_product.name))
+        catalog.apply(version, [ProductOut.model_validate(db_product)])
+        index_product(db_product)
         return db_product
     except Exception as e:
         await db.rollback()
@@ -89,8 +248,44 @@ async def create_product(db: AsyncSession, product: ProductCreate):
 
 
 async def get_product_by_id(db: AsyncSession, product_id: int):
-    result = await db.execute(select(Product).where(Product.id == product_id))
-    return result.scalars().first()
+    return await db.get(Product, product_id)
+
+
+async def get_products_by_ids(db: AsyncSession, product_ids):
+    products = {}
+    missing = []
+    for product_id in product_ids:
+        product = product_cache.get(("id", product_id))
+        if product is None:
+            missing.append(product_id)
+        else:
+            products[product_id] = product
+    if missing:
+        # = ANY(:ids) keeps one statement shape for any number of ids, unlike an expanded IN list.
+        result = await db.execute(select(Product).where(Product.id == any_(literal(missing, ARRAY(Integer)))))
+        for db_product in result.scalars():
+            product = ProductOut.model_validate(db_product)
+            product_cache.set(("id", product.id), product)
+            products[product.id] = product
+    return products
+
+
+def product_loader(db: AsyncSession) -> BatchLoader:
+    """A BatchLoader fetching products through ``db``; build one per session, since it memoizes what it loads."""
+    return BatchLoader(lambda product_ids: get_products_by_ids(db, product_ids))
+
+
+async def get_cached_product(db: AsyncSession, product_id: int):
+    products = await get_products_by_ids(db, [product_id])
+    return products.get(product_id)
+
+
+async def get_cached_products_by_name(db: AsyncSession, name: str):
+    products = product_cache.get(("name", name))
+    if products is None:
+        products = tuple(ProductOut.model_validate(p) for p in await get_all_product_by_name(db, name))
+        product_cache.set(("name", name), products)
+    return products
 
 
 async def get_all_product(db: AsyncSession):
@@ -98,6 +293,22 @@ async def get_all_product(db: AsyncSession):
     return result.scalars().all()
 
 
+product_query = ListQuery(Product, default_sort="id")
+
+
+async def get_products_page(db: AsyncSession, params, limit: int, sort: str = None, cursor: str = None,
+                            with_total: bool = False):
+    return await select_with_filter(db, product_query, params, limit, sort, cursor, with_total)
+
+
+async def stream_products(db: AsyncSession, batch_size: int = 1000):
+    stmt = select(Product.id, Product.name, Product.price, Product.description, Product.stock, Product.image_url,
+                  Product.last_modified)
+    result = await db.stream(stmt.order_by(Product.id).execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
+
+
 async def get_all_product_by_name(db: AsyncSession, name: str):
     result = await db.execute(select(Product).where(Product.name == name))
     return result.scalars().all()
@@ -108,14 +319,21 @@ async def update_product(db: AsyncSession, product_update: ProductUpdate, produc
         product = await get_product_by_id(db, product_id)
         if product is None:
             return False
+        invalidate_cached_products(product)
         update_data = product_update.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(product, key, value)
 
         product.last_modified = datetime.now()
+        version = await bump_catalog_version(db, [product.id])
 
         await db.commit()
         await db.refresh(product)
+        invalidate_cached_products(product)
+        cached = ProductOut.model_validate(product)
+        product_cache.set(("id", product.id), cached)
+        catalog.apply(version, [cached])
+        index_product(product)
         return True
 
     except Exception as e:
@@ -129,7 +347,11 @@ async def delete_product(db: AsyncSession, product_id: int):
         if product is None:
             return False
         await db.delete(product)
+        version = await bump_catalog_version(db, [product.id])
         await db.commit()
+        invalidate_cached_products(product)
+        catalog.apply(version, removed=[product.id])
+        search_index.remove(product.id)
         return True
     except Exception as e:
         await db.rollback()
@@ -137,8 +359,8 @@ async def delete_product(db: AsyncSession, product_id: int):
 
 
 async def get_cart_item(db: AsyncSession, cart_item_id: int):
-    cart_item = await db.execute(select(CartItem).options(selectinload(CartItem.product)).where(CartItem.id == cart_item_id))
-    return cart_item.scalars().first()
+    # db.get answers repeat lookups within a request from the identity map instead of re-querying.
+    return await db.get(CartItem, cart_item_id, options=[selectinload(CartItem.product)])
 
 
 async def get_cart_cart_items(db: AsyncSession, cart_id: int):
@@ -146,36 +368,115 @@ async def get_cart_cart_items(db: AsyncSession, cart_id: int):
     return items.scalars().all()
 
 
+def adjust_cart_total(cart_id: int, delta: float):
+    return update(Cart).where(Cart.id == cart_id) \
+        .values(total_price=func.coalesce(Cart.total_price, 0) + delta) \
+        .execution_options(synchronize_session=False)
+
+
+async def lock_open_cart(db: AsyncSession, cart_id: int):
+    """Lock the cart's row and return its user id; 404 when the cart is gone, 409 once it is no longer open.
+
+    Every writer of a cart's items and checkout take this lock first, so an item change either lands before
+    the checkout reads the cart or finds it checked out.
+    """
+    result = await db.execute(select(Cart.user_id, Cart.status).where(Cart.id == cart_id).with_for_update())
+    cart = result.first()
+    if cart is None:
+        raise HTTPException(status_code=404, detail="Cart not found")
+    if cart.status != CartStatus.OPEN:
+        raise HTTPException(status_code=409, detail="Cart is no longer open")
+    return cart.user_id
+
+
+async def lock_cart_item(db: AsyncSession, item: CartItem):
+    """Lock the item's open cart and row and re-read its quantity; None when the item was deleted in the meantime.
+
+    The quantity loaded before the lock may already be stale, and the cart total is adjusted by the difference.
+    It is written back as the loaded value too, so setting it to that stale value still flushes an UPDATE.
+    """
+    await lock_open_cart(db, item.cart_id)
+    result = await db.execute(select(CartItem.quantity).where(CartItem.id == item.id).with_for_update())
+    quantity = result.scalar()
+    if quantity is not None:
+        set_committed_value(item, "quantity", quantity)
+    return quantity
+
+
 async def update_cart_item(db: AsyncSession, cart_item_update: CartItemUpdate, cart_item_id: int):
     try:
         item = await get_cart_item(db, cart_item_id)
         if item is not None:
+            old_quantity = await lock_cart_item(db, item)
+            if old_quantity is None:
+                raise HTTPException(status_code=404, detail="Item not found.")
             update_data = cart_item_update.model_dump(exclude_unset=True)
             for key, value in update_data.items():
                 setattr(item, key, value)
+            await db.execute(adjust_cart_total(item.cart_id, (item.quantity - old_quantity) * item.product.price))
             await db.commit()
             await db.refresh(item)
         return item
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to update the cart item. ERROR:" + str(e))
 
 
-async def create_cart_item(db: AsyncSession, item: CartItemCreate):
+def not_enough_stock(failed: List[int], quantities: dict, available: dict):
+    return HTTPException(status_code=409, detail={
+        "message": "Not enough in stock.",
+        "failed_items": [{"product_id": product_id, "requested": quantities[product_id],
+                          "available": available.get(product_id, 0)} for product_id in failed],
+    })
+
+
+async def upsert_cart_items(db: AsyncSession, cart_id: int, quantities: dict):
     try:
-        items = await get_cart_cart_items(db, item.cart_id)
-        for i in items:
-            if i.product_id == item.product_id:
-                update_item = CartItemUpdate(quantity=i.quantity + item.quantity)
-                return await update_cart_item(db, update_item, i.id)
-        db_item = CartItem(cart_id=item.cart_id, product_id=item.product_id, quantity=item.quantity)
-        db.add(db_item)
+        # Locking the cart serializes concurrent writers to the same cart and its total, and with checkout.
+        await lock_open_cart(db, cart_id)
+
+        result = await db.execute(
+            select(Product.id, Product.stock, Product.price, func.coalesce(CartItem.quantity, 0))
+            .outerjoin(CartItem, and_(CartItem.product_id == Product.id, CartItem.cart_id == cart_id))
+            .where(Product.id.in_(quantities))
+        )
+        rows = result.all()
+        available = {product_id: stock - in_cart for product_id, stock, price, in_cart in rows}
+        prices = {product_id: price for product_id, stock, price, in_cart in rows}
+        missing = sorted(pid for pid in quantities if pid not in prices)
+        if missing:
+            raise HTTPException(status_code=404, detail={"message": "Product not found.", "product_ids": missing})
+        failed = sorted(pid for pid, quantity in quantities.items() if available.get(pid, 0) < quantity)
+        if failed:
+            raise not_enough_stock(failed, quantities, available)
+
+        stmt = insert(CartItem).values(
+            [{"cart_id": cart_id, "product_id": pid, "quantity": quantity} for pid, quantity in quantities.items()]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+        )
+        result = await db.scalars(stmt.returning(CartItem), execution_options={"populate_existing": True})
+        items = result.all()
+
+        await db.execute(adjust_cart_total(cart_id, sum(prices[pid] * quantity for pid, quantity in quantities.items())))
         await db.commit()
-        await db.refresh(db_item)
-        return db_item
+        return items
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
-        raise HTTPException(status_code=500, detail="Failed to create the cart item. ERROR:" + str(e))
+        raise HTTPException(status_code=500, detail="Failed to add the cart items. ERROR:" + str(e))
+
+
+async def create_cart_item(db: AsyncSession, item: CartItemCreate):
+    items = await upsert_cart_items(db, item.cart_id, {item.product_id: item.quantity})
+    return items[0]
 
 
 async def delete_cart_item(db: AsyncSession, cart_item_id: int):
@@ -183,9 +484,17 @@ async def delete_cart_item(db: AsyncSession, cart_item_id: int):
         item = await get_cart_item(db, cart_item_id)
         if item is None:
             return False
+        quantity = await lock_cart_item(db, item)
+        if quantity is None:
+            await db.rollback()
+            return False
         await db.delete(item)
+        await db.execute(adjust_cart_total(item.cart_id, -quantity * item.product.price))
         await db.commit()
         return True
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to delete the cart item. ERROR:" + str(e))
@@ -209,14 +518,109 @@ async def get_cart(db: AsyncSession, cart_id: int):
     return cart.scalars().first()
 
 
+async def get_cart_last_modified(db: AsyncSession, cart_id: int):
+    result = await db.execute(select(Cart.last_modified).where(Cart.id == cart_id))
+    return result.first()
+
+
 async def get_user_carts(db: AsyncSession, user_id: int):
     carts = await db.execute(select(Cart).options(selectinload(Cart.items).selectinload(CartItem.product)).where(Cart.user_id == user_id))
     return carts.scalars().all()
 
+cart_query = ListQuery(Cart, default_sort="-created_at", options=(selectinload(Cart.items),), scope=("user_id",))
+cart_summary_query = ListQuery(Cart, default_sort="-created_at", scope=("user_id",), columns=(
+    Cart.id, Cart.user_id, Cart.status, Cart.total_price, Cart.created_at,
+    select(func.count()).where(CartItem.cart_id == Cart.id).scalar_subquery().label("item_count"),
+))
+
+
+async def get_user_carts_page(db: AsyncSession, user_id: int, params, limit: int, sort: str = None,
+                              cursor: str = None, with_total: bool = False, summary: bool = False):
+    query = cart_summary_query if summary else cart_query
+    return await select_with_filter(db, query, params, limit, sort, cursor, with_total, user_id=user_id)
+
+
 async def get_user_open_cart(db: AsyncSession, user_id: int):
     cart = await db.execute(select(Cart).options(selectinload(Cart.items).selectinload(CartItem.product)).where(Cart.user_id == user_id,Cart.status == CartStatus.OPEN))
     return cart.scalars().first()
 
+async def get_user_open_cart_id(db: AsyncSession, user_id: int):
+    result = await db.execute(select(Cart.id).where(Cart.user_id == user_id, Cart.status == CartStatus.OPEN))
+    return result.scalars().first()
+
+
+async def checkout_cart(db: AsyncSession, cart_id: int):
+    try:
+        # Taken first: item writers wait on it, so the items read next are the ones that get checked out.
+        user_id = await lock_open_cart(db, cart_id)
+        result = await db.execute(select(CartItem.product_id, func.sum(CartItem.quantity))
+                                  .where(CartItem.cart_id == cart_id).group_by(CartItem.product_id))
+        quantities = dict(result.all())
+        if not quantities:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+
+        # Lock the product rows in id order so concurrent checkouts of overlapping carts cannot deadlock.
+        await db.execute(select(Product.id).where(Product.id.in_(quantities)).order_by(Product.id).with_for_update())
+        lines = values(column("product_id", Integer), column("quantity", Integer), name="lines") \
+            .data(sorted(quantities.items()))
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == lines.c.product_id, Product.stock >= lines.c.quantity)
+            .values(stock=Product.stock - lines.c.quantity, last_modified=func.now())
+            .returning(Product.id, Product.name, Product.price, Product.description, Product.stock,
+                       Product.image_url, Product.last_modified)
+            .execution_options(synchronize_session=False)
+        )
+        products = result.all()
+        failed = sorted(quantities.keys() - {p.id for p in products})
+        if failed:
+            await db.rollback()
+            result = await db.execute(select(Product.id, Product.stock).where(Product.id.in_(failed)))
+            raise not_enough_stock(failed, quantities, dict(result.all()))
+
+        total_price = sum(p.price * quantities[p.id] for p in products)
+        await db.execute(
+            update(Cart)
+            .where(Cart.id == cart_id)
+            .values(status=CartStatus.CHECKED_OUT, total_price=total_price)
+            .execution_options(synchronize_session=False)
+        )
+        lines = [{"product_id": p.id, "name": p.name, "quantity": quantities[p.id], "price": p.price}
+                 for p in sorted(products, key=lambda p: p.id)]
+        # The catalog change rides on the order insert, the last statement before the commit.
+        logged = log_catalog_change(quantities)
+        result = await db.execute(insert(Order).values(
+            user_id=user_id, cart_id=cart_id, total_price=total_price,
+            item_count=sum(quantities.values()), lines=lines,
+        ).add_cte(logged).returning(Order, select(logged.c.version).limit(1).scalar_subquery()))
+        order, version = result.one()
+        await db.commit()
+        invalidate_cached_products(*products)
+        catalog.apply(version, [ProductOut.model_validate(product) for product in products])
+        for product in products:
+            search_index.set_stock(product.id, product.stock)
+        return order
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to checkout the cart. ERROR:" + str(e))
+
+
+async def get_user_orders(db: AsyncSession, user_id: int, limit: int, after: list = None):
+    stmt = select(Order).where(Order.user_id == user_id)
+    if after:
+        stmt = stmt.where(tuple_(Order.created_at, Order.id) < tuple_(*after))
+    result = await db.execute(stmt.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1))
+    orders = result.scalars().all()
+    next_key = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_key = [orders[-1].created_at, orders[-1].id]
+    return orders, next_key
+
+
 async def update_cart(db: AsyncSession, cart_update: CartUpdate, cart_id: int):
     try:
         cart = await get_cart(db, cart_id)
@@ -233,17 +637,118 @@ async def update_cart(db: AsyncSession, cart_update: CartUpdate, cart_id: int):
         raise HTTPException(status_code=500, detail="Failed to update the cart. ERROR:" + str(e))
 
 
+async def delete_carts(db: AsyncSession, cart_ids):
+    try:
+        await db.execute(delete(CartItem).where(CartItem.cart_id.in_(cart_ids))
+                         .execution_options(synchronize_session=False))
+        result = await db.execute(delete(Cart).where(Cart.id.in_(cart_ids))
+                                  .execution_options(synchronize_session=False))
+        await db.commit()
+        return result.rowcount
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to delete the carts. ERROR:" + str(e))
+
+
 async def delete_cart(db: AsyncSession, cart_id: int):
+    return await delete_carts(db, [cart_id]) > 0
+
+
+async def delete_user_carts(db: AsyncSession, user_id: int):
+    return await delete_carts(db, select(Cart.id).where(Cart.user_id == user_id))
+
+
+async def purge_carts(db: AsyncSession, batch_size: int, user_id: int = None, status: CartStatus = None,
+                      older_than_days: int = None):
+    criteria = []
+    if user_id is not None:
+        criteria.append(Cart.user_id == user_id)
+    if status is not None:
+        criteria.append(Cart.status == status)
+    if older_than_days is not None:
+        criteria.append(Cart.created_at < datetime.now() - timedelta(days=older_than_days))
+    deleted = batches = 0
+    while True:
+        # Each batch is its own short transaction; carts locked by in-flight requests are left for a later run.
+        result = await db.execute(select(Cart.id).where(*criteria).order_by(Cart.id).limit(batch_size)
+                                  .with_for_update(skip_locked=True))
+        cart_ids = result.scalars().all()
+        if not cart_ids:
+            await db.rollback()
+            break
+        deleted += await delete_carts(db, cart_ids)
+        batches += 1
+    return {"deleted": deleted, "batches": batches}
+
+
+async def expire_idle_carts(db: AsyncSession, idle_before: datetime, batch_size: int):
     try:
-        cart = await get_cart(db, cart_id)
-        if cart is None:
-            return False
-        await db.delete(cart)
+        batch = select(Cart.id).where(Cart.status == CartStatus.OPEN, Cart.last_modified < idle_before) \
+            .order_by(Cart.id).limit(batch_size).with_for_update(skip_locked=True)
+        result = await db.execute(update(Cart).where(Cart.id.in_(batch)).values(status=CartStatus.EXPIRED)
+                                  .execution_options(synchronize_session=False))
         await db.commit()
-        return True
+        return result.rowcount
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def archive_carts(db: AsyncSession, batch_size: int):
+    try:
+        result = await db.execute(select(Cart.id).where(Cart.status.in_([CartStatus.EXPIRED, CartStatus.CANCELLED]))
+                                  .order_by(Cart.id).limit(batch_size).with_for_update(skip_locked=True))
+        cart_ids = result.scalars().all()
+        if not cart_ids:
+            await db.rollback()
+            return 0
+        cart_columns = ["id", "user_id", "created_at", "last_modified", "status", "total_price"]
+        await db.execute(insert(ArchivedCart).from_select(
+            cart_columns, select(*(getattr(Cart, c) for c in cart_columns)).where(Cart.id.in_(cart_ids))))
+        item_columns = ["id", "cart_id", "product_id", "quantity"]
+        await db.execute(insert(ArchivedCartItem).from_select(
+            item_columns, select(*(getattr(CartItem, c) for c in item_columns)).where(CartItem.cart_id.in_(cart_ids))))
+        await db.execute(delete(CartItem).where(CartItem.cart_id.in_(cart_ids))
+                         .execution_options(synchronize_session=False))
+        await db.execute(delete(Cart).where(Cart.id.in_(cart_ids)).execution_options(synchronize_session=False))
+        await db.commit()
+        return len(cart_ids)
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def reconcile_cart_totals(db: AsyncSession, fix: bool = True, tolerance: float = 0.005):
+    actual = func.coalesce(func.sum(CartItem.quantity * Product.price), 0)
+    drift = select(Cart.id, Cart.total_price.label("recorded"), actual.label("actual")) \
+        .outerjoin(CartItem, CartItem.cart_id == Cart.id) \
+        .outerjoin(Product, Product.id == CartItem.product_id) \
+        .where(Cart.status == CartStatus.OPEN) \
+        .group_by(Cart.id) \
+        .having(func.abs(func.coalesce(Cart.total_price, 0) - actual) > tolerance)
+    try:
+        if fix:
+            drift = drift.subquery()
+            result = await db.execute(
+                update(Cart)
+                .where(Cart.id == drift.c.id)
+                .values(total_price=drift.c.actual)
+                .returning(Cart.id, drift.c.recorded, drift.c.actual)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            await db.commit()
+        else:
+            result = await db.execute(drift)
+            rows = result.all()
     except Exception as e:
         await db.rollback()
-        raise HTTPException(status_code=500, detail="Failed to delete the cart. ERROR:" + str(e))
+        raise HTTPException(status_code=500, detail="Failed to reconcile the cart totals. ERROR:" + str(e))
+    return {
+        "fixed": fix,
+        "drifted": len(rows),
+        "carts": [{"cart_id": cart_id, "recorded": recorded, "actual": actual} for cart_id, recorded, actual in rows],
+    }
 
 
 async def create_address(db: AsyncSession, address: AddressCreate):
@@ -271,6 +776,14 @@ async def get_user_addresses(db: AsyncSession, user_id: int):
     return result.scalars().all()
 
 
+address_query = ListQuery(Address, default_sort="id", scope=("user_id",))
+
+
+async def get_user_addresses_page(db: AsyncSession, user_id: int, params, limit: int, sort: str = None,
+                                  cursor: str = None, with_total: bool = False):
+    return await select_with_filter(db, address_query, params, limit, sort, cursor, with_total, user_id=user_id)
+
+
 async def get_user_all_address(db: AsyncSession, user_id: int):
     result = await db.execute(select(Address).where(Address.user_id == user_id))
     return result.scalars().all()
@@ -305,15 +818,8 @@ async def delete_address(db: AsyncSession, address_id: int):
         raise HTTPException(status_code=500, detail="Failed to delete the address. ERROR:" + str(e))
 
 
-async def select_with_filter(
-        db: AsyncSession,
-        model: Type[DeclarativeMeta],
-        *filters,
-        order_by: Any = None
-) -> List[Any]:
-    stmt: Select = select(model).where(*filters)
-    if order_by:
-        stmt = stmt.order_by(order_by)
-
-    result = await db.execute(stmt)
-    return result.scalars().all()
+async def select_with_filter(db: AsyncSession, query: ListQuery, params, limit: int, sort: str = None,
+                             cursor: str = None, with_total: bool = False, **scope):
+    stmt, values = query.compile(params, limit, sort, cursor, with_total, **scope)
+    result = await db.execute(stmt, values)
+    return query.page(result.all(), limit, sort, with_total)
@@ -1,20 +1,235 @@
+from fastapi import Request
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import text, event, exc
+import asyncio
+import hashlib
+import hmac
 import os
+import time
 from dotenv import load_dotenv
 from typing import AsyncGenerator
+from utils import metrics
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_async_engine(DATABASE_URL, echo=True)
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", DB_POOL_SIZE))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.connect_count = 0
+        self.connect_time = 0.0
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        record = super()._create_connection()
+        elapsed = time.perf_counter() - start
+        self.connect_count += 1
+        self.connect_time += elapsed
+        # Picked up by _do_get, so opening an overflow connection is not reported as queueing.
+        record.connect_time = elapsed
+        return record
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self._record_wait(time.perf_counter() - start)
+            raise
+        self._record_wait(time.perf_counter() - start - record.__dict__.pop("connect_time", 0.0))
+        return record
+
+    def _record_wait(self, elapsed: float):
+        elapsed = max(elapsed, 0.0)
+        metrics.record_pool_wait(elapsed)
+        self.wait_count += 1
+        self.wait_time += elapsed
+        self.max_wait_time = max(self.max_wait_time, elapsed)
+
+
+def create_engine_from_url(url: str):
+    connect_args = {}
+    if make_url(url).get_driver_name() == "asyncpg":
+        connect_args["prepared_statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+    new_engine = create_async_engine(
+        url,
+        echo=DB_ECHO,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+    event.listen(new_engine.sync_engine, "before_cursor_execute", metrics.before_cursor_execute)
+    event.listen(new_engine.sync_engine, "after_cursor_execute", metrics.after_cursor_execute)
+    return new_engine
+
+
+class PrimarySession(Session):
+    pass
+
+
+engine = create_engine_from_url(DATABASE_URL)
+read_engine = create_engine_from_url(READ_DATABASE_URL) if READ_DATABASE_URL else engine
 # noinspection PyTypeChecker
 AsyncSessionLocal = sessionmaker(
     bind= engine,
     class_= AsyncSession,
+    sync_session_class=PrimarySession,
+    expire_on_commit=False
+)
+# noinspection PyTypeChecker
+AsyncReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
     expire_on_commit=False
 )
 Base = declarative_base()
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+WROTE_AT_COOKIE = "wrote_at"
+
+
+def sign_write_time(wrote_at: int) -> str:
+    signature = hmac.new(os.getenv("SECRET_KEY", "").encode(), str(wrote_at).encode(), hashlib.sha256).hexdigest()
+    return f"{wrote_at}.{signature}"
+
+
+def recently_wrote(cookie: str) -> bool:
+    """Whether a signed write time (epoch milliseconds) from the client is younger than READ_YOUR_WRITES_SECONDS."""
+    wrote_at, _, _ = cookie.partition(".")
+    if not wrote_at.isdigit() or not hmac.compare_digest(cookie, sign_write_time(int(wrote_at))):
+        return False
+    return time.time() - int(wrote_at) / 1000 < READ_YOUR_WRITES_SECONDS
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def pin_writer_to_primary(session):
+    state = session.info.get("request_state")
+    if state is not None:
+        state[WROTE_AT_COOKIE] = int(time.time() * 1000)
+
+
+class ReadYourWritesMiddleware:
+    """Sends a client that committed a write a signed cookie with the write time, so its reads stay on the primary.
+
+    The pin travels with the client, so it holds whichever worker serves the next read. Only installed when a
+    replica is configured; clients that do not keep cookies may read their writes from the lagging replica.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            wrote_at = scope.get("state", {}).get(WROTE_AT_COOKIE)
+            if message["type"] == "http.response.start" and wrote_at is not None:
+                cookie = (f"{WROTE_AT_COOKIE}={sign_write_time(wrote_at)}; Max-Age={int(READ_YOUR_WRITES_SECONDS)}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        if read_engine is not engine:
+            session.info["request_state"] = request.scope.setdefault("state", {})
+        yield session
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    session_factory = AsyncReadSessionLocal
+    if read_engine is not engine and recently_wrote(request.cookies.get(WROTE_AT_COOKIE, "")):
+        session_factory = AsyncSessionLocal
+    async with session_factory() as session:
+        yield session
+
+
+async def prewarm_engine(target_engine, connections: int):
+    connections = [target_engine.connect() for _ in range(min(connections, DB_POOL_SIZE))]
+    try:
+        await asyncio.gather(*(connection.start() for connection in connections))
+        await asyncio.gather(*(connection.execute(text("SELECT 1")) for connection in connections))
+    finally:
+        await asyncio.gather(*(connection.close() for connection in connections if connection.sync_connection))
+
+
+async def prewarm_pool(connections: int = DB_POOL_PREWARM):
+    await prewarm_engine(engine, connections)
+    if read_engine is not engine:
+        await prewarm_engine(read_engine, connections)
+
+
+async def dispose_engines():
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+
+def engine_pool_stats(target_engine) -> dict:
+    pool = target_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout": pool.timeout(),
+        "wait_count": pool.wait_count,
+        "wait_time_total": pool.wait_time,
+        "wait_time_max": pool.max_wait_time,
+        "connect_count": pool.connect_count,
+        "connect_time_total": pool.connect_time,
+    }
+
+
+def pool_stats() -> dict:
+    stats = {"primary": engine_pool_stats(engine)}
+    if read_engine is not engine:
+        stats["replica"] = engine_pool_stats(read_engine)
+    return stats
+
+
+pool_checked_out = metrics.registry.register(metrics.Gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool.", ("engine",)))
+pool_overflow = metrics.registry.register(metrics.Gauge(
+    "db_pool_overflow", "Overflow connections currently open.", ("engine",)))
+pool_wait_seconds = metrics.registry.register(metrics.Counter(
+    "db_pool_wait_seconds_total", "Total time spent waiting for pooled connections.", ("engine",)))
+pool_connect_seconds = metrics.registry.register(metrics.Counter(
+    "db_pool_connect_seconds_total", "Total time spent opening new pooled connections.", ("engine",)))
+
+
+def collect_pool_metrics():
+    for name, stats in pool_stats().items():
+        pool_checked_out.set((name,), stats["checked_out"])
+        pool_overflow.set((name,), stats["overflow"])
+        pool_wait_seconds.set((name,), stats["wait_time_total"])
+        pool_connect_seconds.set((name,), stats["connect_time_total"])
+
+
+metrics.registry.add_collector(collect_pool_metrics)
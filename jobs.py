@@ -0,0 +1,82 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+import crud
+from database import AsyncSessionLocal, AsyncReadSessionLocal
+from utils.scheduler import PeriodicJob, scheduler
+from utils.catalog import catalog
+
+CART_JOBS_ENABLED = os.getenv("CART_JOBS_ENABLED", "true").lower() == "true"
+CART_IDLE_HOURS = float(os.getenv("CART_IDLE_HOURS", 72))
+CART_JOB_INTERVAL_SECONDS = float(os.getenv("CART_JOB_INTERVAL_SECONDS", 300))
+CART_JOB_BATCH_SIZE = int(os.getenv("CART_JOB_BATCH_SIZE", 500))
+CART_JOB_MAX_BATCHES = int(os.getenv("CART_JOB_MAX_BATCHES", 100))
+CART_JOB_BATCH_PAUSE_SECONDS = float(os.getenv("CART_JOB_BATCH_PAUSE_SECONDS", 0.1))
+CART_RECONCILE_INTERVAL_SECONDS = float(os.getenv("CART_RECONCILE_INTERVAL_SECONDS", 3600))
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true"
+SEARCH_INDEX_REBUILD_SECONDS = float(os.getenv("SEARCH_INDEX_REBUILD_SECONDS", 3600))
+CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT_ENABLED", "true").lower() == "true"
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", 2))
+CATALOG_CHANGES_RETENTION = int(os.getenv("CATALOG_CHANGES_RETENTION", 10000))
+CATALOG_PRUNE_SECONDS = float(os.getenv("CATALOG_PRUNE_SECONDS", 3600))
+
+
+async def run_in_batches(job: PeriodicJob, counter: str, step):
+    for _ in range(CART_JOB_MAX_BATCHES):
+        processed = await step()
+        job.count(counter, processed)
+        if processed < CART_JOB_BATCH_SIZE:
+            return
+        await asyncio.sleep(CART_JOB_BATCH_PAUSE_SECONDS)
+
+
+async def expire_and_archive_carts(job: PeriodicJob):
+    idle_before = datetime.now() - timedelta(hours=CART_IDLE_HOURS)
+    async with AsyncSessionLocal() as db:
+        await run_in_batches(job, "expired", lambda: crud.expire_idle_carts(db, idle_before, CART_JOB_BATCH_SIZE))
+        await run_in_batches(job, "archived", lambda: crud.archive_carts(db, CART_JOB_BATCH_SIZE))
+
+
+async def reconcile_cart_totals(job: PeriodicJob):
+    async with AsyncSessionLocal() as db:
+        report = await crud.reconcile_cart_totals(db)
+    job.count("corrected", report["drifted"])
+
+
+async def load_search_index():
+    async with AsyncReadSessionLocal() as db:
+        return await crud.rebuild_search_index(db)
+
+
+async def rebuild_search_index(job: PeriodicJob):
+    # Other workers' writes only reach this worker's index through a periodic rebuild.
+    job.count("indexed", await load_search_index())
+
+
+async def load_catalog():
+    async with AsyncReadSessionLocal() as db:
+        if CATALOG_SNAPSHOT_ENABLED:
+            return await crud.rebuild_catalog(db)
+        catalog.version = await crud.get_catalog_version(db)
+        return 0
+
+
+async def sync_catalog(job: PeriodicJob):
+    # Also keeps this worker's product cache and search index in step with other workers' writes.
+    async with AsyncReadSessionLocal() as db:
+        job.count("synced", await crud.sync_catalog(db))
+
+
+async def prune_catalog_changes(job: PeriodicJob):
+    async with AsyncSessionLocal() as db:
+        job.count("pruned", await crud.prune_catalog_changes(db, CATALOG_CHANGES_RETENTION))
+
+
+def register_jobs():
+    if CART_JOBS_ENABLED:
+        scheduler.add("expire_and_archive_carts", expire_and_archive_carts, CART_JOB_INTERVAL_SECONDS)
+        scheduler.add("reconcile_cart_totals", reconcile_cart_totals, CART_RECONCILE_INTERVAL_SECONDS)
+    if SEARCH_INDEX_ENABLED:
+        scheduler.add("rebuild_search_index", rebuild_search_index, SEARCH_INDEX_REBUILD_SECONDS)
+    scheduler.add("sync_catalog", sync_catalog, CATALOG_POLL_SECONDS)
+    scheduler.add("prune_catalog_changes", prune_catalog_changes, CATALOG_PRUNE_SECONDS)
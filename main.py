@@ -1,16 +1,53 @@
 import asyncio
-from database import engine, Base
-from routers import users, addresses, carts, cart_items, products
+import os
+from contextlib import asynccontextmanager
+from database import engine, read_engine, Base, prewarm_pool, dispose_engines, ReadYourWritesMiddleware
+from jobs import register_jobs, load_search_index, load_catalog, SEARCH_INDEX_ENABLED
+from utils.scheduler import scheduler
+from utils.metrics import MetricsMiddleware, registry
+from utils.query_budget import QueryBudgetMiddleware
+from utils.responses import FastJSONResponse
+from routers import users, addresses, carts, cart_items, products, orders, internal
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 import uvicorn
 
-app = FastAPI()
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await prewarm_pool()
+    if SEARCH_INDEX_ENABLED:
+        await load_search_index()
+    await load_catalog()
+    register_jobs()
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+# Added first so it sits inside the metrics middleware and sees the same per-request stats.
+app.add_middleware(QueryBudgetMiddleware)
+if read_engine is not engine:
+    app.add_middleware(ReadYourWritesMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 app.include_router(users.router)
 app.include_router(addresses.router)
 app.include_router(carts.router)
 app.include_router(cart_items.router)
 app.include_router(products.router)
+app.include_router(orders.router)
+app.include_router(internal.router)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 async def init_models():
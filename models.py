@@ -1,6 +1,8 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, func, Boolean, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, DateTime, func, Boolean, Enum, Index, UniqueConstraint, JSON, \
+    Sequence
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
 from utils.enums import CartStatus
@@ -27,23 +29,69 @@ class Cart(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"),nullable=False)
     created_at = Column(DateTime, index=True, default=func.now, nullable=False)
+    last_modified = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
     status = Column(Enum(CartStatus), default=CartStatus.OPEN, index=True)
     total_price = Column(Float, default=0)
 
-    items = relationship("CartItem", back_populates="cart")
+    items = relationship("CartItem", back_populates="cart", cascade="all, delete-orphan", passive_deletes=True)
     user = relationship("User", back_populates="carts")
 
+    __filterable__ = ("id", "status", "total_price", "created_at", "last_modified")
+    __sortable__ = ("id", "total_price", "created_at", "last_modified")
+    __table_args__ = (
+        Index("ix_carts_status_last_modified", "status", "last_modified"),
+        Index("ix_carts_user_created_id", "user_id", "created_at", "id"),
+    )
+
 
 class CartItem(Base):
     __tablename__ = 'cart_items'
     id = Column(Integer, primary_key=True, index=True)
-    cart_id = Column(Integer, ForeignKey("carts.id"))
+    cart_id = Column(Integer, ForeignKey("carts.id", ondelete="CASCADE"))
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, nullable=False)
 
     cart = relationship("Cart", back_populates="items")
     product = relationship("Product")
 
+    __table_args__ = (
+        UniqueConstraint("cart_id", "product_id", name="uq_cart_items_cart_product"),
+    )
+
+
+class ArchivedCart(Base):
+    __tablename__ = 'carts_archive'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, index=True, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    last_modified = Column(DateTime, nullable=False)
+    status = Column(Enum(CartStatus), nullable=False)
+    total_price = Column(Float)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ArchivedCartItem(Base):
+    __tablename__ = 'cart_items_archive'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    cart_id = Column(Integer, index=True, nullable=False)
+    product_id = Column(Integer)
+    quantity = Column(Integer, nullable=False)
+
+
+class Order(Base):
+    __tablename__ = 'orders'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    cart_id = Column(Integer, nullable=True)
+    total_price = Column(Float, nullable=False)
+    item_count = Column(Integer, nullable=False)
+    lines = Column(JSON().with_variant(JSONB, "postgresql"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_orders_user_created_id", "user_id", "created_at", "id"),
+    )
+
 
 class Product(Base):
     __tablename__ = 'products'
@@ -55,6 +103,33 @@ class Product(Base):
     image_url = Column(String, nullable=True)
     last_modified = Column(DateTime(timezone=True), server_default=func.now(), server_onupdate=func.now())
 
+    __filterable__ = ("id", "name", "price", "stock", "last_modified")
+    __sortable__ = ("id", "name", "price", "stock", "last_modified")
+    __table_args__ = (
+        Index("ix_products_last_modified_id", "last_modified", "id"),
+        Index("ix_products_price_id", "price", "id"),
+    )
+
+
+# Hands out catalog versions without locking, so they can commit out of order; see crud.get_catalog_changes.
+catalog_version = Sequence("catalog_version_seq", metadata=Base.metadata)
+
+
+class CatalogPruned(Base):
+    # A single row holding the highest version pruned from catalog_changes; only the prune job writes it.
+    __tablename__ = 'catalog_pruned'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(BigInteger, nullable=False)
+
+
+class CatalogChange(Base):
+    __tablename__ = 'catalog_changes'
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, index=True)
+    product_id = Column(Integer, nullable=False)
+    # Statement time rather than transaction start, i.e. when the version was handed out.
+    created_at = Column(DateTime(timezone=True), server_default=func.clock_timestamp(), nullable=False)
+
 
 class Address(Base):
     __tablename__ = 'addresses'
@@ -65,3 +140,6 @@ class Address(Base):
     address = Column(String, index=True, nullable=False)
 
     user = relationship("User", back_populates="addresses")
+
+    __filterable__ = ("id", "country", "city")
+    __sortable__ = ("id", "country", "city")
@@ -1,18 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.functions import user
 
-from database import get_db
-from schemas import AddressUpdate, AddressCreate, AddressOut
+from database import get_db, get_read_db
+from schemas import AddressUpdate, AddressCreate, AddressOut, AddressPage, UserOut
 import crud
-from models import User
 from utils.dependencies import get_current_user
+from utils.responses import ModelResponse
 
 router = APIRouter(prefix="/addresses", tags=["addresses"])
 
+PAGE_SIZE = int(os.getenv("ADDRESSES_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("ADDRESSES_MAX_PAGE_SIZE", 500))
+
 
 @router.post("/add", response_model=AddressOut)
-async def create_address(current_user: User = Depends(get_current_user),
+async def create_address(current_user: UserOut = Depends(get_current_user),
                          address: AddressCreate = Depends(AddressCreate), db: AsyncSession = Depends(get_db)):
     if not current_user.is_admin or address.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
@@ -24,7 +29,7 @@ async def create_address(current_user: User = Depends(get_current_user),
 
 
 @router.put("/update", response_model=AddressOut)
-async def update_address(new_address: AddressUpdate, address_id: int, current_user: User = Depends(get_current_user),
+async def update_address(new_address: AddressUpdate, address_id: int, current_user: UserOut = Depends(get_current_user),
                          db: AsyncSession = Depends(get_db)):
     old_address = await crud.get_address(db, address_id)
     if old_address is None:
@@ -35,8 +40,8 @@ async def update_address(new_address: AddressUpdate, address_id: int, current_us
     return updated_address
 
 
-@router.delete("/delete", response_model=AddressOut)
-async def delete_address(address_id: int, current_user: User = Depends(get_current_user),
+@router.delete("/delete", response_model=bool)
+async def delete_address(address_id: int, current_user: UserOut = Depends(get_current_user),
                          db: AsyncSession = Depends(get_db)):
     address = await crud.get_address(db, address_id)
     if address is None:
@@ -45,8 +50,18 @@ async def delete_address(address_id: int, current_user: User = Depends(get_curre
         raise HTTPException(status_code=403, detail="Forbidden")
     return await crud.delete_address(db, address_id)
 
+@router.get("/", response_model=AddressPage)
+async def get_my_addresses(request: Request, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                           cursor: Optional[str] = None, sort: str = "id", with_total: bool = False,
+                           current_user: UserOut = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    addresses, next_cursor, total = await crud.get_user_addresses_page(db, current_user.id,
+                                                                       request.query_params.multi_items(), limit, sort,
+                                                                       cursor, with_total)
+    return ModelResponse({"items": addresses, "next_cursor": next_cursor, "total": total}, AddressPage)
+
+
 @router.get("/{address_id}", response_model=AddressOut)
-async def get_address(address_id: int, db: AsyncSession = Depends(get_db)):
+async def get_address(address_id: int, db: AsyncSession = Depends(get_read_db)):
     address = await crud.get_address(db, address_id)
     if address is None:
         raise HTTPException(status_code=404, detail="Address not found")
@@ -2,8 +2,10 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from schemas import CartItemCreate, CartItemUpdate, CartItemOut, CartUpdate
+from schemas import CartItemCreate, CartItemUpdate, CartItemOut, CartItemBatch
 import crud
+from utils.loader import BatchLoader
+from utils.query_budget import query_budget
 
 router = APIRouter(prefix="/cart_items", tags=["CartItem"])
 
@@ -17,27 +19,32 @@ async def get_cart_item(cart_item_id: int, db: AsyncSession = Depends(get_db)):
 
 
 @router.post("/add", response_model=CartItemOut)
+@query_budget(max_queries=4)
 async def add_cart_item(cart_item: CartItemCreate, db: AsyncSession = Depends(get_db)):
-    if is_in_stock(cart_item.quantity,cart_item.product_id,db):
-        item = await crud.create_cart_item(db, cart_item)
-        if item is None:
-            raise HTTPException(status_code=500, detail="Failed to create the cart item.")
-        await update_cart_total_price(item.cart_id, db)
-        return item
-    else:
-        raise HTTPException(status_code=404, detail="Not enough in stock.")
+    return await crud.create_cart_item(db, cart_item)
+
+
+@router.post("/batch", response_model=List[CartItemOut])
+@query_budget(max_queries=4)
+async def add_cart_items(batch: CartItemBatch, db: AsyncSession = Depends(get_db)):
+    quantities = {}
+    for line in batch.items:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+    return await crud.upsert_cart_items(db, batch.cart_id, quantities)
 
 
 @router.put("/{cart_item_id}", response_model=CartItemOut)
+@query_budget(max_queries=9)
 async def update_cart_item(cart_item: CartItemUpdate, cart_item_id: int, db: AsyncSession = Depends(get_db)):
     item = await crud.get_cart_item(db, cart_item_id)
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found.")
-    if is_in_stock(cart_item.quantity,item.product_id,db):
+    # Loaded through the request's own session: a second (read) session would hold a second pooled connection
+    # while this one is checked out, and enough concurrent updates would exhaust the pool waiting on each other.
+    if await is_in_stock(cart_item.quantity, item.product_id, crud.product_loader(db)):
         updated_item = await crud.update_cart_item(db, cart_item, cart_item_id)
         if updated_item is None:
             raise HTTPException(status_code=500, detail="Failed to update the cart item.")
-        await update_cart_total_price(item.cart_id, db)
         return updated_item
     else:
         raise HTTPException(status_code=404, detail="Not enough in stock.")
@@ -49,8 +56,8 @@ async def delete_cart_item(cart_item_id: int, db: AsyncSession = Depends(get_db)
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     is_delete = await crud.delete_cart_item(db, cart_item_id)
-    if is_delete is None:
-        raise HTTPException(status_code=500, detail="Failed to delete the cart item.")
+    if not is_delete:
+        raise HTTPException(status_code=404, detail="Item not found")
     return item
 
 
@@ -62,17 +69,8 @@ async def get_cart_items(cart_id: int, db: AsyncSession = Depends(get_db)):
     return await crud.get_cart_cart_items(db, cart_id)
 
 
-async def update_cart_total_price(cart_id: int, db: AsyncSession = Depends(get_db)):
-    cart = await crud.get_cart(db, cart_id)
-    price = 0
-    for item in cart.items:
-        price += item.quantity * item.product.price
-    new_cart = CartUpdate(total_price=price)
-    await crud.update_cart(db, new_cart, cart_id)
-
-
-async def is_in_stock(stock: int, product_id: int, db: AsyncSession = Depends(get_db)):
-    product = await crud.get_product_by_id(db, product_id)
-    if stock > product.stock:
+async def is_in_stock(stock: int, product_id: int, products: BatchLoader):
+    product = await products.load(product_id)
+    if product is None or stock > product.stock:
         return False
     return True
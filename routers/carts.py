@@ -1,35 +1,59 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from typing import Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
-from schemas import CartCreate, CartUpdate, CartOut, CartItemOut, ProductUpdate
+from database import get_db, get_read_db
+from schemas import (CartCreate, CartUpdate, CartOut, UserOut, CartPage, CartSummaryPage, CheckoutOut, DeletedCount,
+                     Message, PurgeResult, ReconcileResult)
 import crud
-from models import Cart, User
-from utils.enums import CartStatus
-from utils.dependencies import get_current_user
+from utils.enums import CartStatus, CartView
+from utils.dependencies import get_current_user, get_current_admin
+from utils.query_budget import query_budget
+from utils.responses import ModelResponse
+from utils.http_cache import etag, cache_headers, is_fresh, not_modified
 
 router = APIRouter(prefix="/carts", tags=["Cart"])
 
+PAGE_SIZE = int(os.getenv("CARTS_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("CARTS_MAX_PAGE_SIZE", 500))
+CART_SORT = "-created_at"
+PURGE_BATCH_SIZE = int(os.getenv("CART_PURGE_BATCH_SIZE", 500))
+MAX_PURGE_BATCH_SIZE = int(os.getenv("CART_PURGE_MAX_BATCH_SIZE", 5000))
+CACHE_CONTROL = os.getenv("CARTS_CACHE_CONTROL", "private, no-cache")
+
 
 @router.get("/cart/{cart_id}", response_model=CartOut)
-async def get_cart(cart_id: int, db: AsyncSession = Depends(get_db)):
+async def get_cart(cart_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    if "if-none-match" in request.headers:
+        # Revalidate against the cart row alone before loading its items.
+        row = await crud.get_cart_last_modified(db, cart_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Cart not found")
+        tag = etag("cart", cart_id, row.last_modified)
+        if is_fresh(request, tag):
+            return not_modified(tag, CACHE_CONTROL)
     cart = await crud.get_cart(db, cart_id)
     if cart is None:
         raise HTTPException(status_code=404, detail="Cart not found")
-    return cart
+    return ModelResponse(cart, CartOut, headers=cache_headers(etag("cart", cart.id, cart.last_modified), CACHE_CONTROL))
 
 
-@router.get("/user/{user_id}/all", response_model=List[CartOut])
-async def get_user_carts(user_id: int, db: AsyncSession = Depends(get_db)):
-    user = await crud.get_user_by_id(db, user_id)
-    if user is None:
+@router.get("/user/{user_id}/all", response_model=Union[CartPage, CartSummaryPage])
+@query_budget(max_queries=3)
+async def get_user_carts(user_id: int, request: Request, view: CartView = CartView.FULL,
+                         limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+                         sort: str = CART_SORT, with_total: bool = False, db: AsyncSession = Depends(get_read_db)):
+    if not await crud.user_exists(db, user_id):
         raise HTTPException(status_code=404, detail="User not found")
-    carts = await crud.get_user_carts(db, user_id)
-    return carts
+    summary = view == CartView.SUMMARY
+    carts, next_cursor, total = await crud.get_user_carts_page(db, user_id, request.query_params.multi_items(), limit,
+                                                               sort, cursor, with_total, summary)
+    page_model = CartSummaryPage if summary else CartPage
+    return ModelResponse({"items": carts, "next_cursor": next_cursor, "total": total}, page_model)
 
 
-@router.get("/user/open_cart", response_model=CartOut)
-async def get_user_open_cart(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+@router.get("/user/open_cart", response_model=Optional[CartOut])
+async def get_user_open_cart(current_user: UserOut = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
     user = await crud.get_user_by_id(db, current_user.id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -39,7 +63,7 @@ async def get_user_open_cart(current_user: User = Depends(get_current_user), db:
 
 @router.post("/add_cart", response_model=CartOut)
 async def add_cart(cart: CartCreate, db: AsyncSession = Depends(get_db),
-                   current_user: User = Depends(get_current_user)):
+                   current_user: UserOut = Depends(get_current_user)):
     open_cart = await get_user_open_cart(current_user, db)
     if open_cart is not None:
         return open_cart
@@ -48,25 +72,32 @@ async def add_cart(cart: CartCreate, db: AsyncSession = Depends(get_db),
 
 
 @router.delete("/{cart_id}", response_model=CartOut)
+@query_budget(max_queries=5)
 async def delete_cart(cart_id: int, db: AsyncSession = Depends(get_db)):
     cart = await crud.get_cart(db, cart_id)
     if cart is None:
         raise HTTPException(status_code=404, detail="Cart not found")
-    cart_items: List[CartItemOut] = await crud.get_cart_cart_items(db, cart_id)
-    for item in cart_items:
-        await crud.delete_cart_item(db, item.id)
     await crud.delete_cart(db, cart_id)
     return cart
 
 
-@router.delete("/user/delete/all")
-async def delete_user_all_cart(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+@router.delete("/user/delete/all", response_model=DeletedCount)
+async def delete_user_all_cart(current_user: UserOut = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     user = await crud.get_user_by_id(db, current_user.id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    carts = await crud.get_user_carts(db, current_user.id)
-    for cart in carts:
-        await delete_cart(cart.id, db)
+    deleted = await crud.delete_user_carts(db, current_user.id)
+    return {"deleted": deleted}
+
+
+@router.delete("/admin/purge", response_model=PurgeResult)
+async def purge_carts(user_id: Optional[int] = None, status: Optional[CartStatus] = None,
+                      older_than_days: Optional[int] = Query(None, ge=0),
+                      batch_size: int = Query(PURGE_BATCH_SIZE, ge=1, le=MAX_PURGE_BATCH_SIZE),
+                      db: AsyncSession = Depends(get_db), current_user: UserOut = Depends(get_current_admin)):
+    if user_id is None and status is None and older_than_days is None:
+        raise HTTPException(status_code=400, detail="At least one of user_id, status or older_than_days is required")
+    return await crud.purge_carts(db, batch_size, user_id, status, older_than_days)
 
 
 @router.put("/{cart_id}", response_model=CartOut)
@@ -78,28 +109,27 @@ async def update_cart(cart_id: int, cart: CartUpdate, db: AsyncSession = Depends
     return updated_cart
 
 
-@router.put("/cart/checkout")
+@router.put("/cart/checkout", response_model=CheckoutOut)
+@query_budget(max_queries=7)
 async def checkout(
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        current_user: UserOut = Depends(get_current_user)
 ):
-    cart: Cart = await get_user_open_cart(current_user, db)
-    if not cart or not cart.items:
+    cart_id = await crud.get_user_open_cart_id(db, current_user.id)
+    if cart_id is None:
         raise HTTPException(status_code=400, detail="Cart is empty")
-    price = 0
-    for item in cart.items:
-        price += item.price
-    new_cart = CartUpdate(status=CartStatus.CHECKED_OUT, total_price=price)
-    cart = await crud.update_cart(db, new_cart, cart.id)
-    if cart is not None:
-        for item in cart.items:
-            product = await crud.get_product_by_id(db,item.id)
-            new_product = ProductUpdate(stock=product.stock - item.stock)
-            await crud.update_product(db, new_product, item.id)
-    return {"message": "Checkout successful (mocked)"}
-
-
-@router.put("/cart/cancel")
+    order = await crud.checkout_cart(db, cart_id)
+    return {"message": "Checkout successful", "order_id": order.id, "cart_id": cart_id,
+            "total_price": order.total_price}
+
+
+@router.post("/reconcile", response_model=ReconcileResult)
+async def reconcile_cart_totals(fix: bool = True, db: AsyncSession = Depends(get_db),
+                                current_user: UserOut = Depends(get_current_admin)):
+    return await crud.reconcile_cart_totals(db, fix)
+
+
+@router.put("/cart/cancel", response_model=Message)
 async def cancel_cart(cart_id: int, db: AsyncSession = Depends(get_db)):
     cart = await crud.get_cart(db, cart_id)
     if cart is None:
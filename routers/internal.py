@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+from database import pool_stats
+from utils.cache import product_cache, principal_cache, token_cache
+from utils.dependencies import get_current_admin
+from utils.security import hashing_stats
+from utils.scheduler import scheduler
+from utils.search import search_index
+from utils.catalog import catalog
+
+router = APIRouter(prefix="/internal", tags=["Internal"], dependencies=[Depends(get_current_admin)])
+
+
+@router.get("/cache", response_model=dict)
+async def get_cache_stats():
+    return {"product": product_cache.stats(), "principal": principal_cache.stats(), "token": token_cache.stats()}
+
+
+@router.get("/hashing", response_model=dict)
+async def get_hashing_stats():
+    return hashing_stats()
+
+
+@router.get("/pool", response_model=dict)
+async def get_pool_stats():
+    return pool_stats()
+
+
+@router.get("/jobs", response_model=dict)
+async def get_job_stats():
+    return scheduler.stats()
+
+
+@router.get("/search", response_model=dict)
+async def get_search_stats():
+    return search_index.stats()
+
+
+@router.get("/catalog", response_model=dict)
+async def get_catalog_stats():
+    return catalog.stats()
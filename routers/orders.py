@@ -0,0 +1,40 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_read_db
+from schemas import OrderPage, UserOut
+import crud
+from utils.dependencies import get_current_user
+from utils.pagination import encode_cursor, decode_cursor
+from utils.query_budget import query_budget
+from utils.responses import ModelResponse
+
+router = APIRouter(prefix="/orders", tags=["Orders"])
+
+PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", 20))
+MAX_PAGE_SIZE = int(os.getenv("ORDERS_MAX_PAGE_SIZE", 200))
+ORDER_SORT = "-created_at"
+
+
+async def get_orders_page(db: AsyncSession, user_id: int, limit: int, cursor: Optional[str]):
+    after = decode_cursor(cursor, ORDER_SORT) if cursor else None
+    orders, next_key = await crud.get_user_orders(db, user_id, limit, after)
+    return OrderPage(items=orders, next_cursor=encode_cursor(ORDER_SORT, next_key) if next_key else None)
+
+
+@router.get("/me", response_model=OrderPage)
+@query_budget(max_queries=1)
+async def get_my_orders(limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+                        current_user: UserOut = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    return ModelResponse(await get_orders_page(db, current_user.id, limit, cursor), OrderPage)
+
+
+@router.get("/user/{user_id}", response_model=OrderPage)
+@query_budget(max_queries=1)
+async def get_user_orders(user_id: int, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          cursor: Optional[str] = None, current_user: UserOut = Depends(get_current_user),
+                          db: AsyncSession = Depends(get_read_db)):
+    if not current_user.is_admin and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return ModelResponse(await get_orders_page(db, user_id, limit, cursor), OrderPage)
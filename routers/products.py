@@ -1,17 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from typing import Optional, List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
-from schemas import ProductCreate, ProductUpdate, ProductOut
+from database import get_db, get_read_db, AsyncReadSessionLocal
+from schemas import ProductCreate, ProductUpdate, ProductOut, ProductPage, ProductSearchPage
 import crud
-from utils.dependencies import get_current_user
+from utils.dependencies import get_current_user, get_product_loader
+from utils.loader import BatchLoader
+from utils.enums import ExportFormat
+from utils.search import search_index
+from utils.query_budget import query_budget
+from utils.responses import ModelResponse
+from utils.http_cache import etag, body_etag, cache_headers, is_fresh, not_modified
+from utils.catalog import catalog
+from utils.pagination import decode_cursor
+from utils.query import RESERVED_PARAMS
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
+PAGE_SIZE = int(os.getenv("PRODUCTS_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("PRODUCTS_MAX_PAGE_SIZE", 500))
+EXPORT_BATCH_SIZE = int(os.getenv("PRODUCTS_EXPORT_BATCH_SIZE", 1000))
+MAX_BATCH_IDS = int(os.getenv("PRODUCTS_MAX_BATCH_IDS", 100))
+SEARCH_MAX_OFFSET = int(os.getenv("PRODUCTS_SEARCH_MAX_OFFSET", 1000))
+CACHE_CONTROL = os.getenv("PRODUCTS_CACHE_CONTROL", "public, max-age=60")
+LIST_CACHE_CONTROL = os.getenv("PRODUCTS_LIST_CACHE_CONTROL", "public, max-age=30")
 
 @router.post("/add", response_model=ProductOut)
 async def add_product(product_data: ProductCreate, db: AsyncSession = Depends(get_db),
                       current_user=Depends(get_current_user)):
-    if await crud.get_all_product_by_name(db, product_data.name) is None:
+    if await crud.get_cached_products_by_name(db, product_data.name):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="a product with this name already exist"
@@ -23,6 +42,7 @@ async def add_product(product_data: ProductCreate, db: AsyncSession = Depends(ge
 
 
 @router.put("/{product_id}", response_model=ProductOut)
+@query_budget(max_queries=4)
 async def update_product(product_id: int, product_data: ProductUpdate, db: AsyncSession = Depends(get_db),
                          current_user=Depends(get_current_user)):
     product = await crud.get_product_by_id(db, product_id)
@@ -30,10 +50,12 @@ async def update_product(product_id: int, product_data: ProductUpdate, db: Async
         raise HTTPException(status_code=404, detail="Product not found")
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Only admins can perform this action")
-    return await crud.update_product(db, product_data, product_id)
+    await crud.update_product(db, product_data, product_id)
+    return await crud.get_cached_product(db, product_id)
 
 
-@router.delete("/{product_id}")
+@router.delete("/{product_id}", response_model=bool)
+@query_budget(max_queries=3)
 async def delete_product(product_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(get_current_user)):
     product = await crud.get_product_by_id(db, product_id)
     if product is None:
@@ -43,21 +65,113 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db), cu
     return await crud.delete_product(db, product_id)
 
 
-@router.get("/{product_id}")
-async def get_product_by_id(product_id: int, db: AsyncSession = Depends(get_db)):
-    product = await crud.get_product_by_id(db, product_id)
+async def export_rows(export_format: ExportFormat):
+    # The request-scoped session is closed before the body is streamed, so the export owns its own session.
+    async with AsyncReadSessionLocal() as db:
+        separator = b"\n" if export_format == ExportFormat.NDJSON else b","
+        if export_format == ExportFormat.JSON:
+            yield b"["
+        first = True
+        async for rows in crud.stream_products(db, EXPORT_BATCH_SIZE):
+            chunk = separator.join(ProductOut.model_validate(row).model_dump_json().encode() for row in rows)
+            if export_format == ExportFormat.NDJSON:
+                yield chunk + separator
+            else:
+                yield chunk if first else separator + chunk
+            first = False
+        if export_format == ExportFormat.JSON:
+            yield b"]"
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_products(export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format")):
+    media_type = "application/x-ndjson" if export_format == ExportFormat.NDJSON else "application/json"
+    return StreamingResponse(export_rows(export_format), media_type=media_type)
+
+
+@router.get("/catalog", response_model=List[ProductOut])
+async def get_catalog(request: Request):
+    if not catalog.loaded:
+        raise HTTPException(status_code=503, detail="Catalog snapshot is not loaded")
+    gzipped = "gzip" in request.headers.get("accept-encoding", "")
+    tag = etag("catalog", catalog.digest, gzipped)
+    if is_fresh(request, tag):
+        return not_modified(tag, LIST_CACHE_CONTROL)
+    headers = cache_headers(tag, LIST_CACHE_CONTROL)
+    headers["Vary"] = "Accept-Encoding"
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(await catalog.gzip_body(), media_type="application/json", headers=headers)
+    return Response(catalog.body(), media_type="application/json", headers=headers)
+
+
+@router.get("/batch", response_model=List[Optional[ProductOut]])
+@query_budget(max_queries=1)
+async def get_products_batch(ids: str = Query(..., description="Comma-separated product ids"),
+                             db: AsyncSession = Depends(get_read_db)):
+    try:
+        product_ids = [int(product_id) for product_id in ids.split(",") if product_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be a comma-separated list of integers")
+    if len(product_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids can be requested at once")
+    products = await crud.get_products_by_ids(db, set(product_ids))
+    # Missing ids stay in place as null, so the response lines up with the requested order.
+    return ModelResponse([products.get(product_id) for product_id in product_ids], List[Optional[ProductOut]])
+
+
+@router.get("/search", response_model=ProductSearchPage)
+@query_budget(max_queries=1)
+async def search_products(q: str = Query(..., min_length=1, max_length=200),
+                          min_price: Optional[float] = Query(None, ge=0), max_price: Optional[float] = Query(None, ge=0),
+                          in_stock: bool = False, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET), db: AsyncSession = Depends(get_read_db)):
+    total, product_ids = search_index.search(q, limit, offset, min_price, max_price, in_stock)
+    products = await crud.get_products_by_ids(db, product_ids)
+    return ModelResponse({"items": [products[product_id] for product_id in product_ids if product_id in products],
+                          "total": total}, ProductSearchPage)
+
+
+@router.get("/{product_id}", response_model=ProductOut)
+@query_budget(max_queries=1)
+async def get_product_by_id(product_id: int, request: Request, products: BatchLoader = Depends(get_product_loader)):
+    product = await products.load(product_id)
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    tag = etag("product", product.id, product.last_modified)
+    if is_fresh(request, tag):
+        return not_modified(tag, CACHE_CONTROL)
+    return ModelResponse(product, ProductOut, headers=cache_headers(tag, CACHE_CONTROL))
 
 
-@router.get("/", response_model=list[ProductOut])
-async def get_all_products(db: AsyncSession = Depends(get_db)):
-    products = await crud.get_all_product(db)
-    return products
+@router.get("/", response_model=ProductPage)
+@query_budget(max_queries=1)
+async def get_all_products(request: Request, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                           cursor: Optional[str] = None, sort: str = "id", with_total: bool = False,
+                           db: AsyncSession = Depends(get_read_db)):
+    unfiltered = all(key in RESERVED_PARAMS for key in request.query_params)
+    if catalog.loaded and unfiltered and sort == "id" and not with_total:
+        # Tagged from the snapshot's own entries and checked before any work, so a revalidation costs nothing.
+        tag = etag("products", catalog.digest, request.url.query)
+        if is_fresh(request, tag):
+            return not_modified(tag, LIST_CACHE_CONTROL)
+        after = decode_cursor(cursor, sort) if cursor else [None]
+        if len(after) != 1 or not isinstance(after[0], (int, type(None))):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return Response(catalog.page(after[0], limit), media_type="application/json",
+                        headers=cache_headers(tag, LIST_CACHE_CONTROL))
+    products, next_cursor, total = await crud.get_products_page(db, request.query_params.multi_items(), limit, sort,
+                                                                cursor, with_total)
+    response = ModelResponse({"items": products, "next_cursor": next_cursor, "total": total}, ProductPage)
+    # The rows come from the replica, which may lag this worker's catalog version, so tag what was read.
+    tag = body_etag(response.body)
+    if is_fresh(request, tag):
+        return not_modified(tag, LIST_CACHE_CONTROL)
+    response.headers.update(cache_headers(tag, LIST_CACHE_CONTROL))
+    return response
 
 
-@router.get("/{product_name}", response_model=ProductOut)
-async def get_product_by_name(product_name: str, db: AsyncSession = Depends(get_db)):
+@router.get("/{product_name}", response_model=List[ProductOut])
+async def get_product_by_name(product_name: str, db: AsyncSession = Depends(get_read_db)):
     product = await crud.get_all_product_by_name(db, product_name)
     return product
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, List
 from utils.enums import CartStatus
@@ -70,13 +70,26 @@ class ProductOut(BaseModel):
     description: Optional[str]
     stock: int
     image_url: Optional[str]
+    # Kept on cached instances for ETags, never serialized.
+    last_modified: Optional[datetime] = Field(None, exclude=True)
 
     class Config:
         from_attributes = True
 
 
+class ProductPage(BaseModel):
+    items: List[ProductOut]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class ProductSearchPage(BaseModel):
+    items: List[ProductOut]
+    total: int
+
+
 class CartItemCreate(BaseModel):
-    quantity: int
+    quantity: int = Field(gt=0)
     product_id: int
     cart_id: int
 
@@ -88,8 +101,18 @@ class CartItemOut(CartItemCreate):
         from_attributes = True
 
 
+class CartItemLine(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+
+class CartItemBatch(BaseModel):
+    cart_id: int
+    items: List[CartItemLine] = Field(min_length=1)
+
+
 class CartItemUpdate(BaseModel):
-    quantity: Optional[int] = None
+    quantity: int = Field(gt=0)
 
 
 class CartCreate(BaseModel):
@@ -107,12 +130,61 @@ class CartOut(CartCreate):
         from_attributes = True
 
 
+class CartPage(BaseModel):
+    items: List[CartOut]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class CartSummary(BaseModel):
+    id: int
+    user_id: int
+    status: CartStatus
+    total_price: float
+    created_at: datetime
+    item_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class CartSummaryPage(BaseModel):
+    items: List[CartSummary]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
 class CartUpdate(BaseModel):
     status: Optional[CartStatus] = CartStatus.OPEN
     items: Optional[List[CartItemCreate]] = None
     total_price: Optional[float] = None
 
 
+class OrderLine(BaseModel):
+    product_id: int
+    name: str
+    quantity: int
+    price: float
+
+
+class OrderOut(BaseModel):
+    id: int
+    user_id: int
+    cart_id: Optional[int]
+    total_price: float
+    item_count: int
+    lines: List[OrderLine]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class OrderPage(BaseModel):
+    items: List[OrderOut]
+    next_cursor: Optional[str] = None
+
+
 class AddressCreate(BaseModel):
     user_id: int
     country: str
@@ -131,3 +203,40 @@ class AddressUpdate(BaseModel):
     country: Optional[str] = None
     city: Optional[str] = None
     address: Optional[str] = None
+
+
+class AddressPage(BaseModel):
+    items: List[AddressOut]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class Message(BaseModel):
+    message: str
+
+
+class DeletedCount(BaseModel):
+    deleted: int
+
+
+class PurgeResult(DeletedCount):
+    batches: int
+
+
+class CheckoutOut(BaseModel):
+    message: str
+    order_id: int
+    cart_id: int
+    total_price: float
+
+
+class CartDrift(BaseModel):
+    cart_id: int
+    recorded: float
+    actual: float
+
+
+class ReconcileResult(BaseModel):
+    fixed: bool
+    drifted: int
+    carts: List[CartDrift]
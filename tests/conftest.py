@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app modules import as top-level names (crud, database, ...), so the project root must be importable.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest_plugins = ["pytester"]
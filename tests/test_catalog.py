@@ -0,0 +1,28 @@
+from schemas import ProductOut
+from utils.catalog import CatalogSnapshot
+
+
+def product(product_id: int, price: float = 10.0) -> ProductOut:
+    return ProductOut(id=product_id, name=f"product {product_id}", price=price, description=None, stock=5,
+                      image_url=None)
+
+
+def loaded(*products) -> CatalogSnapshot:
+    snapshot = CatalogSnapshot()
+    snapshot.load({p.id: CatalogSnapshot.encode(p) for p in products}, version=1)
+    return snapshot
+
+
+def test_patched_digest_matches_a_fresh_load():
+    snapshot = loaded(product(1), product(2), product(3))
+    snapshot.patch([product(2, price=12.5), product(4)], removed=[3])
+
+    assert snapshot.digest == loaded(product(1), product(2, price=12.5), product(4)).digest
+    assert snapshot.digest != loaded(product(1), product(2), product(4)).digest
+
+
+def test_digest_ignores_the_version():
+    first, second = loaded(product(1)), loaded(product(1))
+    second.version = 7
+
+    assert first.digest == second.digest
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+# The checked-in .env always names a database, so these tests only run against one given explicitly;
+# they create their own users, products and carts there and leave them behind.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not (TEST_DATABASE_URL or "").startswith("postgresql"):
+    pytest.skip("TEST_DATABASE_URL is not set to a Postgres database", allow_module_level=True)
+
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from fastapi import HTTPException
+from sqlalchemy import select, func
+
+import crud
+from database import AsyncSessionLocal, engine, Base
+from models import User, Product, Cart, CartItem, Order
+from utils.enums import CartStatus
+
+
+async def seed(carts: int, stock: int, quantity: int):
+    tag = uuid.uuid4().hex[:8]
+    async with AsyncSessionLocal() as db:
+        user = User(username=f"checkout-{tag}", email=f"checkout-{tag}@example.com", password="-", is_admin=False)
+        product = Product(name=f"checkout-sku-{tag}", price=9.99, stock=stock)
+        db.add_all([user, product])
+        await db.flush()
+        carts = [Cart(user_id=user.id, status=CartStatus.OPEN, created_at=datetime.now(), total_price=9.99 * quantity)
+                 for _ in range(carts)]
+        db.add_all(carts)
+        await db.flush()
+        db.add_all([CartItem(cart_id=cart.id, product_id=product.id, quantity=quantity) for cart in carts])
+        await db.commit()
+        return product.id, [cart.id for cart in carts]
+
+
+async def checkout(cart_id: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        try:
+            await crud.checkout_cart(db, cart_id)
+            return True
+        except HTTPException as e:
+            if e.status_code != 409:
+                raise
+            return False
+
+
+async def run_checkouts(carts: int, stock: int, quantity: int):
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        product_id, cart_ids = await seed(carts, stock, quantity)
+        results = await asyncio.gather(*(checkout(cart_id) for cart_id in cart_ids))
+        async with AsyncSessionLocal() as db:
+            remaining = await db.scalar(select(Product.stock).where(Product.id == product_id))
+            checked_out = await db.scalar(select(func.count()).where(Cart.id.in_(cart_ids),
+                                                                     Cart.status == CartStatus.CHECKED_OUT))
+        return sum(results), checked_out, remaining
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.parametrize("carts, stock, quantity", [(50, 20, 1), (30, 25, 2), (10, 100, 3)])
+def test_parallel_checkouts_never_oversell(carts, stock, quantity):
+    succeeded, checked_out, remaining = asyncio.run(run_checkouts(carts, stock, quantity))
+
+    assert remaining >= 0
+    assert succeeded == checked_out == min(carts, stock // quantity)
+    assert remaining == stock - succeeded * quantity
+
+
+async def add_item(cart_id: int, product_id: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        try:
+            await crud.upsert_cart_items(db, cart_id, {product_id: 1})
+            return True
+        except HTTPException as e:
+            if e.status_code != 409:
+                raise
+            return False
+
+
+async def run_checkouts_with_item_writes(carts: int):
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        _, cart_ids = await seed(carts, stock=carts, quantity=1)
+        async with AsyncSessionLocal() as db:
+            extra = Product(name=f"checkout-extra-{uuid.uuid4().hex[:8]}", price=5.0, stock=carts)
+            db.add(extra)
+            await db.commit()
+            extra_id = extra.id
+        results = await asyncio.gather(*(checkout(cart_id) for cart_id in cart_ids),
+                                       *(add_item(cart_id, extra_id) for cart_id in cart_ids))
+        async with AsyncSessionLocal() as db:
+            remaining = await db.scalar(select(Product.stock).where(Product.id == extra_id))
+            in_carts = await db.scalar(select(func.coalesce(func.sum(CartItem.quantity), 0))
+                                       .where(CartItem.cart_id.in_(cart_ids)))
+            ordered = await db.scalar(select(func.sum(Order.item_count)).where(Order.cart_id.in_(cart_ids)))
+        return results[:carts], sum(results[carts:]), carts - remaining, in_carts, ordered
+    finally:
+        await engine.dispose()
+
+
+def test_item_writes_racing_a_checkout_land_before_it_or_are_refused():
+    checkouts, added, extra_taken, in_carts, ordered = asyncio.run(run_checkouts_with_item_writes(30))
+
+    assert all(checkouts)
+    # An accepted item was in the cart when it was checked out: its stock was taken and it is on the order.
+    assert extra_taken == added
+    assert ordered == in_carts
@@ -0,0 +1,67 @@
+import asyncio
+
+from utils.loader import BatchLoader
+
+
+def test_loads_in_one_tick_share_one_batch():
+    calls = []
+
+    async def fetch(keys):
+        calls.append(sorted(keys))
+        return {key: key * 10 for key in keys}
+
+    async def run():
+        loader = BatchLoader(fetch)
+        values = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1))
+        return values, await loader.load(3), await loader.load(1)
+
+    values, later, memoized = asyncio.run(run())
+
+    assert values == [10, 20, 10]
+    assert (later, memoized) == (30, 10)
+    assert calls == [[1, 2], [3]]
+
+
+def test_key_cleared_while_in_flight_still_resolves():
+    calls = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def fetch(keys):
+            calls.append(sorted(keys))
+            await release.wait()
+            return {key: f"batch {len(calls)}" for key in keys}
+
+        loader = BatchLoader(fetch)
+        first = loader.load(1)
+        await asyncio.sleep(0)
+        # The first batch is now in flight; clearing the key must not orphan the future its callers hold.
+        loader.clear(1)
+        second = loader.load(1)
+        release.set()
+        return await asyncio.wait_for(first, 1), await asyncio.wait_for(second, 1)
+
+    assert asyncio.run(run()) == ("batch 1", "batch 2")
+    assert calls == [[1], [1]]
+
+
+def test_failed_batches_are_not_memoized():
+    attempts = []
+
+    async def fetch(keys):
+        attempts.append(sorted(keys))
+        if len(attempts) == 1:
+            raise RuntimeError("connection lost")
+        return {key: key for key in keys}
+
+    async def run():
+        loader = BatchLoader(fetch)
+        try:
+            await loader.load(1)
+        except RuntimeError:
+            pass
+        return await loader.load(1)
+
+    assert asyncio.run(run()) == 1
+    assert attempts == [[1], [1]]
@@ -0,0 +1,55 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from models import Product, Address
+from utils.pagination import encode_cursor
+from utils.query import ListQuery
+
+products = ListQuery(Product)
+
+
+def sql(clause) -> str:
+    return str(clause.compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.parametrize("sort, keyset, predicate", [
+    # NULL prices sort last ascending: past a value come larger values, then every NULL.
+    ("price", "value", "(products.price, products.id) > (%(k0)s, %(k1)s) OR products.price IS NULL"),
+    ("price", "null", "products.price IS NULL AND products.id > %(k1)s"),
+    # And first descending: past a NULL come the remaining NULLs, then every value.
+    ("-price", "value", "(products.price, products.id) < (%(k0)s, %(k1)s)"),
+    ("-price", "null", "products.price IS NOT NULL OR products.id < %(k1)s"),
+])
+def test_after_on_a_nullable_sort_key(sort, keyset, predicate):
+    assert sql(products.after(products.sort_keys(sort), sort.startswith("-"), keyset)) == predicate
+
+
+@pytest.mark.parametrize("query, sort, predicate", [
+    (products, "id", "products.id > %(k0)s"),
+    (products, "-id", "products.id < %(k0)s"),
+    (ListQuery(Address), "-city", "(addresses.city, addresses.id) < (%(k0)s, %(k1)s)"),
+])
+def test_after_on_a_non_nullable_sort_key(query, sort, predicate):
+    assert sql(query.after(query.sort_keys(sort), sort.startswith("-"), "value")) == predicate
+
+
+@pytest.mark.parametrize("after, keyset, values", [
+    ([9.5, 3], "value", {"k0": 9.5, "k1": 3}),
+    ([None, 3], "null", {"k1": 3}),
+])
+def test_compile_picks_the_keyset_from_the_cursor(after, keyset, values):
+    stmt, params = products.compile([], 10, "price", encode_cursor("price", after))
+
+    assert stmt is products.statement(((), "price", keyset, False))
+    assert {key: params[key] for key in params if key.startswith("k")} == values
+
+
+@pytest.mark.parametrize("sort, after", [
+    ("id", ["x"]), ("id", [True]), ("id", [None]), ("price", ["9.5", 3]), ("price", [9.5, None]), ("price", [9.5]),
+])
+def test_compile_rejects_malformed_cursors(sort, after):
+    with pytest.raises(HTTPException) as excinfo:
+        products.compile([], 10, sort, encode_cursor(sort, after))
+
+    assert excinfo.value.status_code == 400
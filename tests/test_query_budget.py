@@ -0,0 +1,88 @@
+import pytest
+
+from utils import query_budget
+from utils.query_budget import statement_shape
+
+PLUGIN = ("-p", "utils.query_budget_plugin")
+
+TESTS = '''
+from utils import query_budget
+
+
+def run(statements, **budget):
+    with query_budget.track("GET /items", **budget) as stats:
+        stats.statements.extend(statements)
+
+
+def test_within_budget():
+    run(["SELECT items.id FROM items WHERE items.id = $1::INTEGER"] * 2, max_queries=2)
+
+
+def test_over_budget():
+    run(["SELECT users.id FROM users WHERE users.id = $1::INTEGER",
+         "SELECT items.id FROM items WHERE items.user_id = $1::INTEGER",
+         "UPDATE items SET seen = true"], max_queries=2)
+
+
+def test_repeated_shape():
+    run([f"SELECT products.name FROM products WHERE products.id = ${n}::INTEGER" for n in range(1, 6)])
+'''
+
+
+@pytest.fixture
+def plugin_state(monkeypatch):
+    # The plugin runs in this process, so restore the module-level switches it sets.
+    monkeypatch.setattr(query_budget, "enabled", query_budget.enabled)
+    monkeypatch.setattr(query_budget, "max_repeats", query_budget.max_repeats)
+    query_budget.violations.clear()
+    yield
+    query_budget.violations.clear()
+
+
+def test_plugin_fails_tests_over_budget_or_repeating_a_shape(pytester, plugin_state):
+    pytester.makepyfile(TESTS)
+    result = pytester.runpytest(*PLUGIN)
+
+    result.assert_outcomes(passed=1, failed=2)
+    result.stdout.fnmatch_lines([
+        "*test_over_budget*",
+        "Query budget exceeded",
+        "GET /items: 3 queries (budget 2, max 3 per statement shape)",
+        "*  1x SELECT users.id FROM users WHERE users.id = ?",
+        "*test_repeated_shape*",
+        "Query budget exceeded",
+        "GET /items: 5 queries (budget None, max 3 per statement shape)",
+        "  !    5x SELECT products.name FROM products WHERE products.id = ?",
+        "*2 failed, 1 passed*",
+    ])
+
+
+def test_plugin_option_overrides_repeat_limit(pytester, plugin_state):
+    pytester.makepyfile(TESTS)
+    result = pytester.runpytest(*PLUGIN, "--query-budget-max-repeats", "5", "-k", "repeated_shape")
+
+    result.assert_outcomes(passed=1, deselected=2)
+
+
+def test_exempt_statements_are_not_counted(plugin_state):
+    with query_budget.track("GET /me", max_queries=1) as stats:
+        stats.statements.append("SELECT items.id FROM items")
+        with query_budget.exempt():
+            assert stats.statements is None
+        assert stats.statements == ["SELECT items.id FROM items"]
+
+    assert not query_budget.violations
+
+
+@pytest.mark.parametrize("statement, shape", [
+    ("SELECT products.id FROM products WHERE products.id IN ($1::INTEGER, $2::INTEGER, $3::INTEGER)",
+     "SELECT products.id FROM products WHERE products.id IN (?...)"),
+    ("SELECT products.id FROM products WHERE products.id = ANY($1::INTEGER[]) LIMIT $2::INTEGER",
+     "SELECT products.id FROM products WHERE products.id = ANY(?) LIMIT ?"),
+    ("SELECT carts.id FROM carts WHERE carts.id IN (%(id_1_1)s, %(id_1_2)s)",
+     "SELECT carts.id FROM carts WHERE carts.id IN (?...)"),
+    ("SELECT carts.id\n  FROM carts\n WHERE carts.user_id IN (?, ?)",
+     "SELECT carts.id FROM carts WHERE carts.user_id IN (?...)"),
+])
+def test_statement_shape(statement, shape):
+    assert statement_shape(statement) == shape
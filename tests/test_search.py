@@ -0,0 +1,56 @@
+from utils.search import SearchIndex
+
+
+def test_writes_during_a_rebuild_are_replayed_onto_the_replacement():
+    index = SearchIndex()
+    index.add(1, "wireless headphones", None, 10.0, 5)
+    index.add(2, "wireless mouse", None, 15.0, 5)
+    index.start_journal()
+
+    # The rebuild read its rows before these writes committed, except product 3, which it already saw.
+    replacement = SearchIndex()
+    replacement.add(1, "wireless headphones", None, 10.0, 5)
+    replacement.add(2, "wireless mouse", None, 15.0, 5)
+    replacement.add(3, "wireless keyboard", None, 20.0, 3)
+    index.add(3, "wireless keyboard", None, 20.0, 3)
+    index.add(4, "wireless charger", None, 25.0, 1)
+    index.set_stock(1, 0)
+    index.remove(2)
+    index.replace_with(replacement)
+
+    assert len(index) == 3
+    total, product_ids = index.search("wireless", 10)
+    assert (total, sorted(product_ids)) == (3, [1, 3, 4])
+    assert sorted(index.search("wireless", 10, in_stock=True)[1]) == [3, 4]
+
+    # The swap ends the journal: a later rebuild replays only what it missed.
+    index.add(5, "wireless speaker", None, 30.0, 2)
+    index.replace_with(SearchIndex())
+    assert len(index) == 0
+
+
+def test_a_dropped_journal_is_not_replayed():
+    index = SearchIndex()
+    index.start_journal()
+    index.add(1, "desk lamp", None, 10.0, 5)
+    index.drop_journal()
+
+    index.replace_with(SearchIndex())
+
+    assert index.search("lamp", 10) == (0, [])
+
+
+def test_compaction_after_many_removes_keeps_the_live_documents():
+    index = SearchIndex()
+    for product_id in range(3000):
+        index.add(product_id, f"lamp model{product_id}", "a desk lamp", 1.0, 1)
+    for product_id in range(2000):
+        index.remove(product_id)
+
+    stats = index.stats()
+    assert stats["documents"] == 1000
+    assert stats["slots"] < 3000
+    total, product_ids = index.search("lamp", 5000)
+    assert (total, sorted(product_ids)) == (1000, list(range(2000, 3000)))
+    assert index.search("model2500", 10) == (1, [2500])
+    assert index.search("model0", 10) == (0, [])
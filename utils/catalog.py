@@ -0,0 +1,121 @@
+import asyncio
+import gzip
+import hashlib
+import os
+from bisect import bisect_right, insort
+from pydantic_core import to_json
+from schemas import ProductOut
+from utils.pagination import encode_cursor
+from utils.responses import adapter
+
+# Low by default: every write invalidates the compressed listing, and level 1 is ~4x faster than 6 for ~25% more bytes.
+CATALOG_GZIP_LEVEL = int(os.getenv("CATALOG_GZIP_LEVEL", 1))
+# How long a missing catalog version may still commit; longer than a write's commit plus any replica lag.
+CATALOG_SETTLE_SECONDS = float(os.getenv("CATALOG_SETTLE_SECONDS", 10))
+
+
+class CatalogSnapshot:
+    """Every product serialized once, kept in id order, with the catalog version it reflects.
+
+    Writes patch single entries; the full listing is re-joined from the cached entry bytes on the next read
+    and gzipped off the event loop, so nothing is re-encoded. ``version`` is the last catalog version applied
+    with no earlier one missing, kept up to date even when no entries are loaded. ``digest`` identifies the
+    entries themselves, so list ETags agree with the bytes served whichever version the rows were read at.
+    """
+
+    def __init__(self, gzip_level: int = CATALOG_GZIP_LEVEL):
+        self.gzip_level = gzip_level
+        self.version = 0
+        self.loaded = False
+        self._ids = []
+        self._entries = {}
+        self._digest = 0
+        self._body = None
+        self._gzip = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    @staticmethod
+    def encode(product: ProductOut) -> bytes:
+        return adapter(ProductOut).dump_json(product)
+
+    @staticmethod
+    def _hash(entry: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(entry, digest_size=12).digest(), "big")
+
+    @property
+    def digest(self) -> str:
+        return format(self._digest, "024x")
+
+    def load(self, entries: dict, version: int):
+        self._ids, self._entries = sorted(entries), entries
+        # XOR of per-entry hashes: each entry carries its id, so a patch swaps one entry's hash in O(1).
+        self._digest = 0
+        for entry in entries.values():
+            self._digest ^= self._hash(entry)
+        self._body = self._gzip = None
+        self.version = version
+        self.loaded = True
+
+    def patch(self, products=(), removed=()):
+        if not self.loaded:
+            return
+        for product in products:
+            entry = self.encode(product)
+            previous = self._entries.get(product.id)
+            if previous is None:
+                insort(self._ids, product.id)
+            else:
+                self._digest ^= self._hash(previous)
+            self._entries[product.id] = entry
+            self._digest ^= self._hash(entry)
+        for product_id in removed:
+            previous = self._entries.pop(product_id, None)
+            if previous is not None:
+                del self._ids[bisect_right(self._ids, product_id) - 1]
+                self._digest ^= self._hash(previous)
+        self._body = self._gzip = None
+
+    def apply(self, version: int, products=(), removed=()) -> bool:
+        """Apply a local write committed as ``version``; left to the next sync if another change sits in between."""
+        if version != self.version + 1:
+            return False
+        self.patch(products, removed)
+        self.version = version
+        return True
+
+    def body(self) -> bytes:
+        if self._body is None:
+            self._body = b"[" + b",".join([self._entries[product_id] for product_id in self._ids]) + b"]"
+        return self._body
+
+    async def gzip_body(self) -> bytes:
+        body = self.body()
+        if self._gzip is None or self._gzip[0] is not body:
+            # Concurrent readers share one compression of the current body; shielded so one disconnect cannot cancel it.
+            self._gzip = (body, asyncio.ensure_future(asyncio.to_thread(gzip.compress, body, self.gzip_level)))
+        return await asyncio.shield(self._gzip[1])
+
+    def page(self, after: int, limit: int) -> bytes:
+        """A ProductPage body for ``limit`` products with ids above ``after``, byte for byte what the DB path sends."""
+        start = bisect_right(self._ids, after) if after is not None else 0
+        ids = self._ids[start:start + limit]
+        next_cursor = None
+        if start + limit < len(self._ids):
+            next_cursor = encode_cursor("id", [ids[-1]])
+        items = b",".join([self._entries[product_id] for product_id in ids])
+        return b'{"items":[' + items + b'],"next_cursor":' + to_json(next_cursor) + b',"total":null}'
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "digest": self.digest,
+            "loaded": self.loaded,
+            "products": len(self._ids),
+            "body_bytes": len(self._body) if self._body is not None else None,
+            "gzip_bytes": len(self._gzip[1].result()) if self._gzip is not None and self._gzip[1].done() else None,
+        }
+
+
+catalog = CatalogSnapshot()
@@ -3,26 +3,56 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 from utils.jwt import decode_access_token
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
-from crud import get_user_by_username
+from database import get_db, get_read_db
+from crud import get_user_by_username, product_loader
+from schemas import UserOut
+from utils.cache import principal_cache
+from utils.loader import BatchLoader
+from utils import query_budget
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-    credentials_exception = HTTPException(
+
+def credentials_exception() -> HTTPException:
+    # A fresh instance per failure: re-raising a shared one grows its traceback with every request's frames.
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+# Async so it runs on the event loop: FastAPI sends sync dependencies through its threadpool, and that hop costs
+# far more than a token-cache hit, besides touching the unlocked cache from worker threads.
+async def get_token_subject(token: str = Depends(oauth2_scheme)) -> str:
     payload = decode_access_token(token)
     if payload is None:
-        raise credentials_exception
+        raise credentials_exception()
 
     username: str = payload.get("sub")
     if username is None:
-        raise credentials_exception
+        raise credentials_exception()
+    return username
+
 
-    user = await get_user_by_username(db, username)
+async def get_current_user(username: str = Depends(get_token_subject), db: AsyncSession = Depends(get_db)):
+    user = principal_cache.get(username)
     if user is None:
-        raise credentials_exception
+        # Only cold principal-cache lookups query, so route budgets count what the route itself issues.
+        with query_budget.exempt():
+            db_user = await get_user_by_username(db, username, with_addresses=False)
+        if db_user is None:
+            raise credentials_exception()
+        user = UserOut.model_validate(db_user)
+        principal_cache.set(username, user)
     return user
+
+
+async def get_current_admin(current_user: UserOut = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admins can perform this action")
+    return current_user
+
+
+async def get_product_loader(db: AsyncSession = Depends(get_read_db)) -> BatchLoader:
+    return product_loader(db)
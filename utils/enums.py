@@ -3,4 +3,15 @@ import enum
 class CartStatus(enum.Enum):
     OPEN = "open"
     CHECKED_OUT = "checked_out"
-    CANCELLED = "cancelled"
\ No newline at end of file
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"
+
+
+class ExportFormat(enum.Enum):
+    NDJSON = "ndjson"
+    JSON = "json"
+
+
+class CartView(enum.Enum):
+    FULL = "full"
+    SUMMARY = "summary"
@@ -0,0 +1,33 @@
+import hashlib
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def etag(*parts) -> str:
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest() + '"'
+
+
+def body_etag(body: bytes) -> str:
+    """A tag for a response already rendered, for reads with no version that is known to match their rows."""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def cache_headers(tag: str, cache_control: str) -> dict:
+    headers = {"ETag": tag}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return headers
+
+
+def is_fresh(request: Request, tag: str) -> bool:
+    """Whether the client's If-None-Match already names ``tag`` (weak comparison, as RFC 9110 asks for GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in header.split(","))
+
+
+def not_modified(tag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(tag, cache_control))
@@ -1,7 +1,10 @@
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+import hashlib
+import time
 import dotenv
 import os
+from utils.cache import token_cache
 
 dotenv.load_dotenv()
 SECRET_KEY = os.getenv('SECRET_KEY')
@@ -15,7 +18,17 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def decode_access_token(token: str):
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+    ttl = token_cache.ttl
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(key, payload, ttl)
+    return payload
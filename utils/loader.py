@@ -0,0 +1,53 @@
+import asyncio
+
+
+class BatchLoader:
+    def __init__(self, batch_fn):
+        self.batch_fn = batch_fn
+        self._futures = {}
+        self._queue = []
+        self._dispatch_task = None
+        # Batches share the request's session, which must never run two statements concurrently.
+        self._lock = asyncio.Lock()
+
+    def load(self, key) -> asyncio.Future:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            # The queue keeps its own reference, so a key cleared while in flight still resolves its callers.
+            self._queue.append((key, future))
+            if self._dispatch_task is None:
+                # The dispatch task first runs on the next loop iteration, after every lookup made in this tick.
+                self._dispatch_task = loop.create_task(self._dispatch())
+        return future
+
+    def load_many(self, keys) -> asyncio.Future:
+        return asyncio.gather(*(self.load(key) for key in keys))
+
+    def prime(self, key, value):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._futures[key] = future
+
+    def clear(self, key):
+        """Forget ``key`` so the next load fetches it again; callers already awaiting it still get their result."""
+        self._futures.pop(key, None)
+
+    async def _dispatch(self):
+        async with self._lock:
+            batch, self._queue, self._dispatch_task = self._queue, [], None
+            try:
+                values = await self.batch_fn([key for key, future in batch])
+            except Exception as e:
+                for key, future in batch:
+                    # Failures are not memoized, so a later load retries.
+                    if self._futures.get(key) is future:
+                        del self._futures[key]
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        for key, future in batch:
+            if not future.done():
+                future.set_result(values.get(key))
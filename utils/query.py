@@ -0,0 +1,177 @@
+import operator
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_, bindparam, func, and_, or_, true, column, Integer
+from utils.cache import TTLCache
+from utils.pagination import encode_cursor, decode_cursor
+
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda column, value: column.in_(value),
+}
+RESERVED_PARAMS = {"limit", "cursor", "sort", "with_total", "view"}
+
+
+def coerce(column, raw: str):
+    python_type = column.type.python_type
+    if python_type is bool:
+        if raw.lower() not in ("true", "false", "1", "0"):
+            raise ValueError(raw)
+        return raw.lower() in ("true", "1")
+    if python_type is datetime:
+        return datetime.fromisoformat(raw)
+    return python_type(raw)
+
+
+def cursor_value(column, value):
+    """A decoded cursor value checked against the column's type, so a hand-edited cursor fails as a 400."""
+    python_type = column.type.python_type
+    if python_type is float and type(value) is int:
+        return float(value)
+    # Exact types: a JSON true would otherwise pass for an int.
+    if type(value) is not python_type:
+        raise ValueError(value)
+    return value
+
+
+class ListQuery:
+    """Declarative list query over one model.
+
+    Filters come from query-string pairs such as ``price__lt=10`` and sorting from ``sort=-last_modified``;
+    only the columns a model lists in ``__filterable__`` and ``__sortable__`` are accepted. Every value is a
+    bind parameter, so the statement is built once per shape (fields, operators, sort, cursor, total) and
+    reused. Pages are keyset-paginated on (sort column, id); NULLs in a nullable sort column order as
+    Postgres orders them by default, after every value ascending and before every value descending.
+    """
+
+    def __init__(self, model, default_sort: str = "id", columns: tuple = None, options: tuple = (),
+                 scope: tuple = ()):
+        self.model = model
+        self.default_sort = default_sort
+        self.columns = columns
+        self.options = options
+        self.scope = scope
+        self._statements = TTLCache(256, float("inf"))
+
+    def parse_filters(self, params) -> list:
+        filters = []
+        for key, raw in params:
+            if key in RESERVED_PARAMS:
+                continue
+            field, _, op = key.partition("__")
+            op = op or "eq"
+            if field not in self.model.__filterable__ or op not in OPERATORS:
+                raise HTTPException(status_code=400, detail=f"Unsupported filter: {key}")
+            column = getattr(self.model, field)
+            try:
+                value = [coerce(column, item) for item in raw.split(",")] if op == "in" else coerce(column, raw)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid value for {key}")
+            filters.append((field, op, value))
+        return filters
+
+    def sort_keys(self, sort: str) -> tuple:
+        field = sort.lstrip("-")
+        if field not in self.model.__sortable__:
+            raise HTTPException(status_code=400, detail=f"Unsupported sort: {sort}")
+        column = getattr(self.model, field)
+        return (column,) if column is self.model.id else (column, self.model.id)
+
+    def conditions(self, filters: tuple) -> list:
+        conditions = [getattr(self.model, field) == bindparam(f"scope_{field}") for field in self.scope]
+        for i, (field, op) in enumerate(filters):
+            column = getattr(self.model, field)
+            conditions.append(OPERATORS[op](column, bindparam(f"p{i}", type_=column.type, expanding=op == "in")))
+        return conditions
+
+    def count_statement(self, conditions: list):
+        return select(func.count().label("total")).select_from(self.model).where(*conditions)
+
+    def after(self, keys: tuple, descending: bool, keyset: str):
+        after = [bindparam(f"k{i}", type_=key.type) for i, key in enumerate(keys)]
+        if len(keys) == 1:
+            return keys[0] < after[0] if descending else keys[0] > after[0]
+        column, key_id = keys
+        if not column.expression.nullable:
+            return tuple_(*keys) < tuple_(*after) if descending else tuple_(*keys) > tuple_(*after)
+        # A row comparison against NULL is NULL, so the NULL block needs predicates of its own.
+        if keyset == "null":
+            return or_(column.is_not(None), key_id < after[1]) if descending \
+                else and_(column.is_(None), key_id > after[1])
+        return tuple_(*keys) < tuple_(*after) if descending else or_(tuple_(*keys) > tuple_(*after), column.is_(None))
+
+    def statement(self, shape: tuple):
+        stmt = self._statements.get(shape)
+        if stmt is not None:
+            return stmt
+        filters, sort, keyset, with_total = shape
+        stmt = select(*self.columns) if self.columns else select(self.model)
+        conditions = self.conditions(filters)
+        if conditions:
+            stmt = stmt.where(*conditions)
+        keys = self.sort_keys(sort)
+        descending = sort.startswith("-")
+        if keyset:
+            stmt = stmt.where(self.after(keys, descending, keyset))
+        stmt = stmt.order_by(*(key.desc() if descending else key.asc() for key in keys)).limit(bindparam("limit"))
+        if with_total:
+            # The page is left-joined onto a one-row count over the filters alone, so every page of a listing
+            # reports the same total, a page past the last row included, without a second statement.
+            page = stmt.subquery("page")
+            total = self.count_statement(conditions).subquery("total")
+            page_keys = [page.c[key.key] for key in keys]
+            stmt = select(page, total.c.total).select_from(total.outerjoin(page, true())) \
+                .order_by(*(key.desc() if descending else key.asc() for key in page_keys))
+            if not self.columns:
+                stmt = select(self.model, column("total", Integer)).from_statement(stmt)
+        if self.options:
+            stmt = stmt.options(*self.options)
+        self._statements.set(shape, stmt)
+        return stmt
+
+    def values(self, filters: list, scope: dict) -> dict:
+        values = {f"scope_{field}": scope[field] for field in self.scope}
+        values.update({f"p{i}": value for i, (_, _, value) in enumerate(filters)})
+        return values
+
+    def compile(self, params, limit: int, sort: str = None, cursor: str = None, with_total: bool = False,
+                **scope):
+        sort = sort or self.default_sort
+        keys = self.sort_keys(sort)
+        filters = self.parse_filters(params)
+        values = self.values(filters, scope)
+        values["limit"] = limit + 1
+        keyset = None
+        if cursor:
+            after = decode_cursor(cursor, sort)
+            if len(after) != len(keys) or after[-1] is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            keyset = "null" if after[0] is None and len(keys) > 1 else "value"
+            try:
+                values.update({f"k{i}": cursor_value(key, value)
+                               for i, (key, value) in enumerate(zip(keys, after)) if value is not None})
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        shape = (tuple((field, op) for field, op, _ in filters), sort, keyset, with_total)
+        return self.statement(shape), values
+
+    def page(self, rows: list, limit: int, sort: str = None, with_total: bool = False):
+        sort = sort or self.default_sort
+        total = rows[0].total if with_total else None
+        if with_total:
+            # An empty page still comes back as one row: the total, with every page column NULL.
+            rows = [row for row in rows if (row.id if self.columns else row[0]) is not None]
+        items = list(rows) if self.columns else [row[0] for row in rows]
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(sort, [getattr(items[-1], key.key) for key in self.sort_keys(sort)])
+        return items, next_cursor, total
+
+    def stats(self) -> dict:
+        return self._statements.stats()
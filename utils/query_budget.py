@@ -0,0 +1,149 @@
+import logging
+import os
+import re
+from collections import Counter, deque
+from contextlib import contextmanager
+from utils.metrics import RequestStats, request_stats
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_ENABLED = os.getenv("QUERY_BUDGET_ENABLED", "false").lower() == "true"
+QUERY_BUDGET_MAX_REPEATS = int(os.getenv("QUERY_BUDGET_MAX_REPEATS", 3))
+
+# asyncpg placeholders carry a cast (``$1::INTEGER``), which belongs to the parameter.
+PARAMETER_PATTERN = re.compile(r"\$\d+(?:::\w+(?:\[\])?)?|%\(\w+\)s|%s|\?")
+PARAMETER_LIST_PATTERN = re.compile(r"\(\?(?:, \?)+\)")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class QueryBudget:
+    def __init__(self, max_queries: int = None, max_repeats: int = None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+
+class Violation:
+    def __init__(self, label: str, budget: QueryBudget, max_repeats: int, shapes: Counter):
+        self.label = label
+        self.budget = budget
+        self.max_repeats = max_repeats
+        self.shapes = shapes
+
+    def report(self) -> str:
+        total = sum(self.shapes.values())
+        lines = [f"{self.label}: {total} queries (budget {self.budget.max_queries}, "
+                 f"max {self.max_repeats} per statement shape)"]
+        for shape, count in self.shapes.most_common():
+            marker = "!" if count > self.max_repeats else " "
+            lines.append(f"  {marker} {count:4}x {shape}")
+        return "\n".join(lines)
+
+
+# Budgets for routes whose endpoint cannot be decorated, keyed by (method, route template).
+budgets = {}
+violations = deque(maxlen=100)
+enabled = QUERY_BUDGET_ENABLED
+max_repeats = QUERY_BUDGET_MAX_REPEATS
+
+
+def query_budget(max_queries: int = None, max_repeats: int = None):
+    """Declare how many SQL statements an endpoint may issue per request.
+
+    Goes below the router decorator. ``max_repeats`` overrides how often one statement shape may repeat
+    before the request is reported as an N+1.
+    """
+    def decorator(func):
+        func.__query_budget__ = QueryBudget(max_queries, max_repeats)
+        return func
+    return decorator
+
+
+def statement_shape(statement: str) -> str:
+    shape = PARAMETER_PATTERN.sub("?", statement)
+    shape = PARAMETER_LIST_PATTERN.sub("(?...)", shape)
+    return WHITESPACE_PATTERN.sub(" ", shape).strip()
+
+
+def check(label: str, budget: QueryBudget, statements: list):
+    shapes = Counter(statement_shape(statement) for statement in statements)
+    repeats = budget.max_repeats if budget.max_repeats is not None else max_repeats
+    over_budget = budget.max_queries is not None and len(statements) > budget.max_queries
+    if over_budget or any(count > repeats for count in shapes.values()):
+        return Violation(label, budget, repeats, shapes)
+    return None
+
+
+def route_budget(scope) -> QueryBudget:
+    route = scope.get("route")
+    if route is None:
+        return QueryBudget()
+    budget = budgets.get((scope["method"], route.path))
+    return budget or getattr(route.endpoint, "__query_budget__", None) or QueryBudget()
+
+
+def record(violation: Violation):
+    violations.append(violation)
+    logger.warning("Query budget exceeded\n%s", violation.report())
+
+
+@contextmanager
+def exempt():
+    """Leave the statements issued inside a ``with`` block out of the current request's budget.
+
+    For lookups whose count depends on cache state rather than on the route, such as resolving the principal.
+    """
+    stats = request_stats.get()
+    statements = stats.statements if stats is not None else None
+    if statements is not None:
+        stats.statements = None
+    try:
+        yield
+    finally:
+        if statements is not None:
+            stats.statements = statements
+
+
+@contextmanager
+def track(label: str = "block", max_queries: int = None, max_repeats: int = None):
+    """Check the statements issued inside a ``with`` block, for code that does not go through a route."""
+    stats = RequestStats([])
+    token = request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        request_stats.reset(token)
+    violation = check(label, QueryBudget(max_queries, max_repeats), stats.statements)
+    if violation is not None:
+        record(violation)
+
+
+class QueryBudgetMiddleware:
+    """Collects each request's SQL statements and reports routes over budget or repeating a statement.
+
+    A passthrough unless enabled (QUERY_BUDGET_ENABLED or the pytest plugin). Reuses the stats the metrics
+    middleware already installed, so it must be added before it (i.e. sit inside it).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = request_stats.set(stats)
+        stats.statements = []
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if token is not None:
+                request_stats.reset(token)
+            route = scope.get("route")
+            label = f"{scope['method']} {route.path if route is not None else scope['path']}"
+            violation = check(label, route_budget(scope), stats.statements)
+            if violation is not None:
+                record(violation)
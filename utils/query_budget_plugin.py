@@ -0,0 +1,30 @@
+"""Pytest plugin failing any test whose requests break their query budget or repeat a statement shape.
+
+Enable with ``python -m pytest -p utils.query_budget_plugin``.
+"""
+import pytest
+from utils import query_budget
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("query-budget")
+    group.addoption("--query-budget-max-repeats", type=int, default=None,
+                    help="How often one statement shape may run per request before it counts as an N+1.")
+
+
+def pytest_configure(config):
+    query_budget.enabled = True
+    repeats = config.getoption("--query-budget-max-repeats")
+    if repeats is not None:
+        query_budget.max_repeats = repeats
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    query_budget.violations.clear()
+    result = yield
+    if query_budget.violations:
+        reports = "\n\n".join(violation.report() for violation in query_budget.violations)
+        query_budget.violations.clear()
+        pytest.fail(f"Query budget exceeded\n{reports}", pytrace=False)
+    return result
@@ -0,0 +1,31 @@
+from functools import lru_cache
+from typing import Any
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: renders with pydantic-core's encoder instead of ``json.dumps``."""
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+@lru_cache(maxsize=None)
+def adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+class ModelResponse(Response):
+    """Validates ``content`` (ORM objects or dicts of them) against ``model`` and dumps it straight to JSON bytes.
+
+    Returning a Response makes FastAPI skip its own validate / dump_python / encode round trip, which dominates
+    large list responses. Pass the route's ``response_model`` so the body matches the documented schema.
+    """
+    media_type = "application/json"
+
+    def __init__(self, content: Any, model, status_code: int = 200, headers: dict = None):
+        type_adapter = adapter(model)
+        body = type_adapter.dump_json(type_adapter.validate_python(content, from_attributes=True))
+        super().__init__(body, status_code, headers)
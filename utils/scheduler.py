@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    def __init__(self, name: str, func, interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.runs = 0
+        self.failures = 0
+        self.running = False
+        self.last_started_at = None
+        self.last_duration = None
+        self.last_error = None
+        self.counters = {}
+
+    def count(self, counter: str, amount: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    async def run_once(self):
+        self.running = True
+        self.last_started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        try:
+            await self.func(self)
+            self.last_error = None
+        except Exception as e:
+            self.failures += 1
+            self.last_error = repr(e)
+            logger.exception("Job %s failed", self.name)
+        finally:
+            self.runs += 1
+            self.running = False
+            self.last_duration = time.perf_counter() - start
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "running": self.running,
+            "last_started_at": self.last_started_at,
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+            "counters": self.counters,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = {}
+        self._tasks = []
+
+    def add(self, name: str, func, interval: float):
+        self.jobs[name] = PeriodicJob(name, func, interval)
+
+    async def _loop(self, job: PeriodicJob):
+        while True:
+            await asyncio.sleep(job.interval)
+            await job.run_once()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+
+scheduler = Scheduler()
@@ -0,0 +1,275 @@
+import heapq
+import math
+import os
+import re
+from array import array
+from bisect import bisect_left
+from itertools import repeat
+
+TOKEN_PATTERN = re.compile(r"\w+")
+NAME_WEIGHT = 3.0
+PREFIX_WEIGHT = 0.6
+TYPO_WEIGHT = 0.4
+MAX_EXPANSIONS = 50
+SEARCH_MAX_DESCRIPTION_TOKENS = int(os.getenv("SEARCH_MAX_DESCRIPTION_TOKENS", 64))
+SEARCH_MIN_TYPO_LENGTH = int(os.getenv("SEARCH_MIN_TYPO_LENGTH", 4))
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", 100000))
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def deletions(token: str) -> set:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        i, j = diffs[0], diffs[-1]
+        return len(diffs) == 2 and j == i + 1 and a[i] == b[j] and a[j] == b[i]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def contains(posting: array, slot: int) -> bool:
+    i = bisect_left(posting, slot)
+    return i < len(posting) and posting[i] == slot
+
+
+class SearchIndex:
+    """Inverted index over product names and descriptions.
+
+    Documents live in dense slots backed by typed arrays, and each token maps to a sorted array of
+    slots, so the index costs a few bytes per posting. Updates tombstone the old slot and append a
+    new one; tombstones are compacted away once they outnumber live documents. A query scores at
+    most max_candidates postings for its most selective term, so near-stopword queries stay cheap
+    and report a capped total.
+
+    While a rebuild builds a replacement, writes are journaled and replayed onto it when it is swapped in.
+    """
+
+    def __init__(self, max_description_tokens: int = 64, min_typo_length: int = 4, max_candidates: int = 100000):
+        self.max_description_tokens = max_description_tokens
+        self.min_typo_length = min_typo_length
+        self.max_candidates = max_candidates
+        self._journal = None
+        self.clear()
+
+    def clear(self):
+        self._slots = {}
+        self._ids = array("q")
+        self._prices = array("d")
+        self._stocks = array("q")
+        self._alive = bytearray()
+        self._dead = 0
+        self._name_postings = {}
+        self._description_postings = {}
+        self._deletions = {}
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+
+    def start_journal(self):
+        if self._journal is None:
+            self._journal = []
+
+    def drop_journal(self):
+        self._journal = None
+
+    def replace_with(self, other: "SearchIndex"):
+        # Writes made while ``other`` was built only reached this index; without the replay the swap would lose them.
+        for method, args in self._journal or ():
+            getattr(other, method)(*args)
+        self.__dict__.update(other.__dict__)
+
+    def _log(self, method: str, *args):
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add(self, product_id: int, name: str, description: str, price: float, stock: int):
+        self._log("add", product_id, name, description, price, stock)
+        self._remove(product_id)
+        slot = len(self._ids)
+        self._slots[product_id] = slot
+        self._ids.append(product_id)
+        self._prices.append(price or 0.0)
+        self._stocks.append(stock or 0)
+        self._alive.append(1)
+        for token in set(tokenize(name)):
+            self._post(self._name_postings, token, slot)
+        for token in set(tokenize(description)[:self.max_description_tokens]):
+            self._post(self._description_postings, token, slot)
+
+    def remove(self, product_id: int):
+        self._log("remove", product_id)
+        self._remove(product_id)
+
+    def _remove(self, product_id: int):
+        slot = self._slots.pop(product_id, None)
+        if slot is None:
+            return
+        self._alive[slot] = 0
+        self._dead += 1
+        if self._dead >= 1024 and self._dead > len(self._slots):
+            self.compact()
+
+    def set_stock(self, product_id: int, stock: int):
+        self._log("set_stock", product_id, stock)
+        slot = self._slots.get(product_id)
+        if slot is not None:
+            self._stocks[slot] = stock
+
+    def _post(self, postings: dict, token: str, slot: int):
+        posting = postings.get(token)
+        if posting is None:
+            if not self._in_vocabulary(token):
+                self._register(token)
+            posting = postings[token] = array("I")
+        posting.append(slot)
+
+    def _in_vocabulary(self, token: str) -> bool:
+        return token in self._name_postings or token in self._description_postings
+
+    def _register(self, token: str):
+        self._vocabulary_dirty = True
+        if len(token) >= self.min_typo_length:
+            for variant in deletions(token):
+                self._deletions.setdefault(variant, []).append(token)
+
+    def compact(self):
+        remap = array("q", [-1]) * len(self._ids)
+        live = 0
+        for slot, alive in enumerate(self._alive):
+            if alive:
+                remap[slot] = live
+                live += 1
+        for postings in (self._name_postings, self._description_postings):
+            for token in list(postings):
+                kept = array("I", (remap[slot] for slot in postings[token] if self._alive[slot]))
+                if kept:
+                    postings[token] = kept
+                else:
+                    del postings[token]
+        keep = [slot for slot, alive in enumerate(self._alive) if alive]
+        self._ids = array("q", (self._ids[slot] for slot in keep))
+        self._prices = array("d", (self._prices[slot] for slot in keep))
+        self._stocks = array("q", (self._stocks[slot] for slot in keep))
+        self._alive = bytearray(b"\x01") * live
+        self._slots = {product_id: slot for slot, product_id in enumerate(self._ids)}
+        self._dead = 0
+        self._deletions = {}
+        for token in set(self._name_postings) | set(self._description_postings):
+            self._register(token)
+
+    def _expand(self, term: str) -> list:
+        expansions = []
+        if self._in_vocabulary(term):
+            expansions.append((term, 1.0))
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(set(self._name_postings) | set(self._description_postings))
+            self._vocabulary_dirty = False
+        i = bisect_left(self._vocabulary, term)
+        while i < len(self._vocabulary) and len(expansions) < MAX_EXPANSIONS:
+            token = self._vocabulary[i]
+            if not token.startswith(term):
+                break
+            if token != term:
+                expansions.append((token, PREFIX_WEIGHT))
+            i += 1
+        if not expansions and len(term) >= self.min_typo_length:
+            candidates = set(self._deletions.get(term, ()))
+            for variant in deletions(term):
+                if self._in_vocabulary(variant):
+                    candidates.add(variant)
+                candidates.update(self._deletions.get(variant, ()))
+            expansions.extend((token, TYPO_WEIGHT) for token in candidates if within_one_edit(term, token))
+        return expansions
+
+    def _frequency(self, token: str) -> int:
+        return len(self._name_postings.get(token, ())) + len(self._description_postings.get(token, ()))
+
+    def _idf(self, token: str) -> float:
+        return math.log(1 + len(self._ids) / (1 + self._frequency(token)))
+
+    def _score(self, expansions: list, candidates: dict = None) -> dict:
+        weighted = []
+        for token, weight in expansions:
+            token_weight = weight * self._idf(token)
+            for postings, field_weight in ((self._name_postings, NAME_WEIGHT), (self._description_postings, 1.0)):
+                posting = postings.get(token)
+                if posting:
+                    weighted.append((token_weight * field_weight, posting))
+        weighted.sort(key=lambda item: item[0], reverse=True)
+        if candidates is None:
+            budget = self.max_candidates
+            for i, (score, posting) in enumerate(weighted):
+                weighted[i] = (score, posting[:budget])
+                budget = max(budget - len(posting), 0)
+        # Apply the lightest postings first, so heavier ones overwrite them and each merge stays in C.
+        weighted.reverse()
+        scores = {}
+        for score, posting in weighted:
+            if candidates is None:
+                slots = posting
+            elif len(candidates) < len(posting):
+                slots = [slot for slot in candidates if contains(posting, slot)]
+            else:
+                slots = [slot for slot in posting if slot in candidates]
+            scores.update(zip(slots, repeat(score)))
+        return scores
+
+    def search(self, query: str, limit: int, offset: int = 0, min_price: float = None, max_price: float = None,
+               in_stock: bool = False):
+        terms = [self._expand(term) for term in dict.fromkeys(tokenize(query))]
+        if not terms or not all(terms):
+            return 0, []
+        # Score the most selective term first and only intersect the remaining terms against its matches.
+        terms.sort(key=lambda expansions: sum(self._frequency(token) for token, _ in expansions))
+        scores = None
+        for expansions in terms:
+            term_scores = self._score(expansions, scores)
+            scores = term_scores if scores is None else {slot: score + term_scores[slot]
+                                                         for slot, score in scores.items() if slot in term_scores}
+            if not scores:
+                return 0, []
+        if min_price is None and max_price is None and not in_stock and not self._dead:
+            matches = scores
+        else:
+            matches = [
+                slot for slot in scores
+                if self._alive[slot]
+                and (min_price is None or self._prices[slot] >= min_price)
+                and (max_price is None or self._prices[slot] <= max_price)
+                and (not in_stock or self._stocks[slot] > 0)
+            ]
+        # Ties keep index order, which is stable between requests so offsets page consistently.
+        top = heapq.nlargest(offset + limit, matches, key=scores.__getitem__)
+        return len(matches), [self._ids[slot] for slot in top[offset:]]
+
+    def stats(self) -> dict:
+        postings = sum(len(p) for p in self._name_postings.values()) + \
+            sum(len(p) for p in self._description_postings.values())
+        return {
+            "documents": len(self._slots),
+            "slots": len(self._ids),
+            "tokens": len(set(self._name_postings) | set(self._description_postings)),
+            "postings": postings,
+            "posting_bytes": postings * 4,
+        }
+
+
+search_index = SearchIndex(SEARCH_MAX_DESCRIPTION_TOKENS, SEARCH_MIN_TYPO_LENGTH, SEARCH_MAX_CANDIDATES)
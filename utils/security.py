@@ -1,9 +1,42 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+HASHING_CONCURRENCY = int(os.getenv("HASHING_CONCURRENCY", os.cpu_count() or 1))
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt releases the GIL, so a thread pool sized to the core count hashes in parallel without blocking the loop.
+_executor = ThreadPoolExecutor(max_workers=HASHING_CONCURRENCY, thread_name_prefix="bcrypt")
+_semaphore = asyncio.Semaphore(HASHING_CONCURRENCY)
+_metrics = {"waiting": 0, "running": 0, "completed": 0, "max_waiting": 0}
+
+
+async def _run_in_pool(func, *args):
+    _metrics["waiting"] += 1
+    _metrics["max_waiting"] = max(_metrics["max_waiting"], _metrics["waiting"])
+    try:
+        await _semaphore.acquire()
+    finally:
+        _metrics["waiting"] -= 1
+    _metrics["running"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _metrics["running"] -= 1
+        _metrics["completed"] += 1
+        _semaphore.release()
+
+
+async def hash_password(password: str) -> str:
+    return await _run_in_pool(pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_pool(pwd_context.verify, plain_password, hashed_password)
+
+
+def hashing_stats() -> dict:
+    return {"concurrency": HASHING_CONCURRENCY, "rounds": BCRYPT_ROUNDS, **_metrics}